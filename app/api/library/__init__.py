@@ -3,6 +3,7 @@ from .albums import router
 from .artists import router
 from .artworks import router
 from .download import router
+from .search import router
 from .streaming import router
 from .tracks import router
 
@@ -15,5 +16,6 @@ library_router.include_router(albums.router)
 library_router.include_router(artists.router)
 library_router.include_router(artworks.router)
 library_router.include_router(download.router)
+library_router.include_router(search.router)
 library_router.include_router(streaming.router)
 library_router.include_router(tracks.router)
\ No newline at end of file
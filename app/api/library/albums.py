@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Query, Depends
 from models.album import AlbumsResponseModel, AlbumResponseModel
 from core.depends import get_library_service
+from core.responses import fast_json
 
 router = APIRouter()
 
@@ -8,11 +9,12 @@ router = APIRouter()
 async def api_get_albums(
     start: int = Query(1, ge=1),
     end: int = Query(40, ge=1),
+    cursor: str | None = Query(None),
     service: get_library_service = Depends(),
 ) -> AlbumsResponseModel:
     
-    albums = await service.get_albums(start, end)
-    return albums
+    albums = await service.get_albums(start, end, cursor)
+    return fast_json(albums)
 
 
 @router.get('/albums/{album_id}', response_model=AlbumResponseModel)
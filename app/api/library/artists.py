@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Query, Depends
 from models.artist import ArtistsResponseModel, ArtistResponseModel
 from core.depends import get_library_service
+from core.responses import fast_json
 
 router = APIRouter()
 
@@ -8,11 +9,12 @@ router = APIRouter()
 async def api_get_artists(
     start: int = Query(1, ge=1),
     end: int = Query(40, ge=1),
+    cursor: str | None = Query(None),
     service: get_library_service = Depends(),
 ) -> ArtistsResponseModel:
 
-    artists = await service.get_artists(start, end)
-    return artists
+    artists = await service.get_artists(start, end, cursor)
+    return fast_json(artists)
 
 
 @router.get('/artists/{artist_id}', response_model=ArtistResponseModel)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Query, Depends
+from models.search import SearchResponseModel
+from core.depends import get_library_service
+from core.responses import fast_json
+
+router = APIRouter()
+
+@router.get('/search', response_model=SearchResponseModel)
+async def api_search(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    service: get_library_service = Depends(),
+) -> SearchResponseModel:
+
+    results = await service.search(query, limit)
+    return fast_json(results)
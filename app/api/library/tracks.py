@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Query, Depends
 from models.track import TracksResponseModel, TrackResponseModel
 from core.depends import get_library_service
+from core.responses import fast_json
 
 router = APIRouter()
 
@@ -8,11 +9,12 @@ router = APIRouter()
 async def api_get_tracks(
     start: int = Query(1, ge=1),
     end: int = Query(40, ge=1),
+    cursor: str | None = Query(None),
     service: get_library_service = Depends(),
 ) -> TracksResponseModel:
     
-    tracks = await service.get_tracks(start, end)
-    return tracks
+    tracks = await service.get_tracks(start, end, cursor)
+    return fast_json(tracks)
 
 
 @router.get('/tracks/{track_id}', response_model=TrackResponseModel)
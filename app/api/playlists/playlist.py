@@ -12,10 +12,11 @@ async def api_get_user_playlists(
     response: Response,
     start: int = Query(1, ge=1),
     end: int = Query(40, ge=1),
+    cursor: str | None = Query(None),
     service: get_playlist_service = Depends(),
 ) -> PlaylistsResponseModel:
 
-    playlists = await service.get_playlists(AuthService.get_user_id(request.cookies.get('session')), start, end)
+    playlists = await service.get_playlists(AuthService.get_user_id(request.cookies.get('session')), start, end, cursor)
     return playlists
 
 
@@ -1,9 +1,13 @@
 from fastapi import APIRouter
 from .ping import router
+from .promote import router
+from .status import router
 
 server_router = APIRouter(
     prefix='/server',
     tags=['Server'],
 )
 
-server_router.include_router(ping.router)
\ No newline at end of file
+server_router.include_router(ping.router)
+server_router.include_router(promote.router)
+server_router.include_router(status.router)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Query, HTTPException, status
+from models.scan import ScanPromoteModel
+from services.library_pipeline import LibraryPipeline
+from services.library_root import LibraryRoot
+from tools.path_handler import str_path
+
+router = APIRouter()
+
+@router.post('/promote', response_model=ScanPromoteModel)
+async def api_post_promote(
+    path: str = Query(..., description='Directory relative to a library root'),
+) -> ScanPromoteModel:
+
+    for root in LibraryRoot.load():
+        library = root.path.resolve()
+        directory = (library / path).resolve()
+
+        if directory.is_relative_to(library) and directory.is_dir():
+            return {
+                'path': path,
+                'promoted': LibraryPipeline.promote_directory(str_path(root.path, directory.relative_to(library))),
+            }
+
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from models.scan import ScanStatusModel
+from services.library_status import LibraryStatus
+
+router = APIRouter()
+
+@router.get('/status', response_model=ScanStatusModel)
+async def api_get_status() -> ScanStatusModel:
+    return LibraryStatus.stats()
@@ -13,6 +13,7 @@ class ConfigData(BaseSettings):
     LOGPATH: Path = get_path(DATADIR, 'mixel-music.log')
     ARTWORKDIR: Path = get_path(DATADIR, 'artworks')
     LIBRARYDIR: Path = get_path('library')
+    LIBRARYDIRS: list[Path] = []
     ARTWORKFORMAT: str = 'webp'
     ARTWORKCACHING: bool = os.getenv('ARTWORKCACHING').lower() in ['true', '1', 'yes']
     ARTWORKQUALITY: int = int(os.getenv('ARTWORKQUALITY'))
@@ -22,8 +23,47 @@ class ConfigData(BaseSettings):
         '.jpeg',
         '.tiff'
     }
+    EXTRACTWORKERS: int = os.cpu_count() or 1
+    EXTRACTCHUNKSIZE: int = 32
+    WALKWORKERS: int = 8
+    WALKQUEUESIZE: int = 64
+    SCANIGNORE: list[str] = [
+        r'^\.',
+        r'.*~$',
+    ]
+    PIPELINEQUEUESIZE: int = 16
+    SCANRECENT: float = 86400.0
+    PROMOTELIMIT: int = 1000
+    TAGCACHE: bool = True
+    TAGCACHEDIR: Path = get_path(DATADIR, 'tags')
+    TAGCACHESIZE: int = 2 ** 30
+    RECONCILECHUNKSIZE: int = 1000
+    SCANBATCHSIZE: int = 500
+    SCANFLUSHINTERVAL: float = 2.0
+    AGGREGATEDELAY: float = 2.0
+    AGGREGATEMAXDELAY: float = 30.0
+    WATCHPOLLING: bool | None = None
+    WATCHDEBOUNCE: int = 1600
+    WATCHSTEP: int = 50
+    ROOTTIMEOUT: float = 10.0
+    ROOTRETRY: float = 60.0
     DEBUG: bool = True
     DBECHO: bool = False
+    DBEXPLAIN: bool = False
+    DBREADERS: int = 4
+    DBTIMEOUT: float = 30.0
+    WRITEBATCH: int = 32
+    STREAMCACHESIZE: int = 1024
+    STREAMCACHETTL: float = 300.0
+    FASTJSON: bool = False
+    DBPRAGMAS: dict[str, str | int] = {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    }
     LOGLEVEL: int = logging.DEBUG
     DBURL: str = "sqlite+aiosqlite:///" \
         + str_path(DATADIR, 'database.db', rel=False)
@@ -1,16 +1,43 @@
+import re
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
 from fastapi import HTTPException
-from sqlalchemy import text, func, select, insert, update, delete, or_, and_, join, exists
+from sqlalchemy import event, text, func, select, insert, update, delete, or_, and_, join, exists, literal, literal_column, bindparam, tuple_, union, union_all, cast, Integer
 from sqlalchemy.exc import OperationalError, SQLAlchemyError, DatabaseError, NoResultFound
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncConnection
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import sessionmaker, declarative_base, aliased
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.dialects.sqlite import Insert
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Any
 from core.config import Config
 from core.logging import logs
+from core.migrations import migrate_database
 
 Base = declarative_base()
-engine = create_async_engine(Config.DBURL, echo=Config.DBECHO)
+
+# SQLite takes one writer at a time, so writes share a single connection and queue for it
+# in the pool instead of on the database lock. Reads get their own pool and, under WAL,
+# never wait behind a write.
+engine = create_async_engine(
+    Config.DBURL,
+    echo=Config.DBECHO,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1,
+    max_overflow=0,
+    pool_timeout=Config.DBTIMEOUT,
+)
+read_engine = create_async_engine(
+    Config.DBURL,
+    echo=Config.DBECHO,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=Config.DBREADERS,
+    max_overflow=0,
+    pool_timeout=Config.DBTIMEOUT,
+)
 
 session = sessionmaker(
     class_=AsyncSession,
@@ -18,27 +45,246 @@ session = sessionmaker(
     autoflush=False,
     bind=engine,
 )
+read_session = sessionmaker(
+    class_=AsyncSession,
+    autocommit=False,
+    autoflush=False,
+    bind=read_engine,
+)
+
+
+def set_pragmas(pragmas: dict[str, str | int]):
+    """
+    Returns a connect listener that applies `pragmas` to every new pooled connection.
+    """
+    def listener(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return listener
+
+
+event.listen(engine.sync_engine, 'connect', set_pragmas(Config.DBPRAGMAS))
+event.listen(read_engine.sync_engine, 'connect', set_pragmas({**Config.DBPRAGMAS, 'query_only': 'ON'}))
+
+
+# The sqlite3 driver opens transactions on its own and a SAVEPOINT outside one commits on
+# release, so the writer begins its transactions itself. IMMEDIATE takes the write lock
+# up front instead of failing to upgrade a read lock later.
+@event.listens_for(engine.sync_engine, 'connect')
+def disable_driver_transactions(dbapi_connection, connection_record) -> None:
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine.sync_engine, 'begin')
+def begin_immediate(conn) -> None:
+    conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+class WriteQueue:
+    """
+    Hands the writer session to one job at a time, interactive jobs before bulk ones.
+
+    Jobs that are waiting when one finishes join its transaction, each in a savepoint so a
+    failing job only rolls back its own writes, and up to `WRITEBATCH` jobs are committed
+    together. A job returns once its group is committed, an interactive job ends its group.
+    """
+    INTERACTIVE = 0
+    BULK = 1
+
+    waiting: list[tuple[int, int, asyncio.Future]] = []
+    sequence = itertools.count()
+    busy = False
+    conn: AsyncSession | None = None
+    group: list[asyncio.Future] = []
+    jobs = 0
+    commits = 0
+    wait_max = 0.0
+    waits: dict[int, deque[float]] = {INTERACTIVE: deque(maxlen=1000), BULK: deque(maxlen=1000)}
+    commit_times: deque[float] = deque(maxlen=1000)
+
+
+    @classmethod
+    async def acquire(cls, priority: int) -> None:
+        if not cls.busy:
+            cls.busy = True
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(cls.waiting, (priority, next(cls.sequence), future))
 
-@asynccontextmanager
-async def db_conn() -> AsyncGenerator[AsyncSession, None]:
-    async with session() as conn:
         try:
-            yield conn
-            await conn.commit()
+            await asyncio.wait_for(asyncio.shield(future), Config.DBTIMEOUT)
+        except BaseException:
+            # The turn may have been handed over while the wait was given up.
+            if future.done():
+                if not cls.handoff():
+                    await asyncio.shield(cls.finish())
+            else:
+                future.cancel()
+            raise
+
+
+    @classmethod
+    def handoff(cls) -> bool:
+        """
+        Gives the turn to the next live waiter, the caller keeps it if there is none.
+        """
+        while cls.waiting:
+            _, _, future = heapq.heappop(cls.waiting)
+            if not future.done():
+                future.set_result(None)
+                return True
+
+        return False
+
 
-        except Exception as error:
-            if not isinstance(error, HTTPException):
+    @classmethod
+    async def finish(cls) -> None:
+        """
+        Commits the open group, then passes the turn on or frees it.
+        """
+        if cls.conn is not None:
+            conn, group, cls.conn, cls.group = cls.conn, cls.group, None, []
+            started = time.monotonic()
+
+            try:
+                await conn.commit()
+            except Exception as error:
                 logs.error("Error occurred: %s", error)
                 await conn.rollback()
-            raise
+                for future in group:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for future in group:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                await conn.close()
+                cls.commits += 1
+                cls.commit_times.append(time.monotonic() - started)
+
+        if not cls.handoff():
+            cls.busy = False
+
+
+    @classmethod
+    @asynccontextmanager
+    async def write(cls, priority: int = BULK) -> AsyncGenerator[AsyncSession, None]:
+        queued = time.monotonic()
+        await cls.acquire(priority)
+        wait = time.monotonic() - queued
+        cls.waits[priority].append(wait)
+        cls.wait_max = max(cls.wait_max, wait)
+
+        if cls.conn is None:
+            cls.conn = session()
+        conn = cls.conn
+        committed = asyncio.get_running_loop().create_future()
+
+        try:
+            savepoint = await conn.begin_nested()
+
+            try:
+                yield conn
+            except BaseException as error:
+                if isinstance(error, HTTPException):
+                    await savepoint.commit()
+                else:
+                    if isinstance(error, Exception):
+                        logs.error("Error occurred: %s", error)
+                    await savepoint.rollback()
+                raise
+            else:
+                await savepoint.commit()
+
+        finally:
+            cls.group.append(committed)
+            cls.jobs += 1
+
+            # An interactive job commits its group right away, waiting for the bulk jobs
+            # queued behind it would add their run time to its latency.
+            if priority == cls.INTERACTIVE or len(cls.group) >= Config.WRITEBATCH or not cls.handoff():
+                await asyncio.shield(cls.finish())
+
+            await committed
+
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        def average(values: deque[float]) -> float:
+            return sum(values) / len(values) if values else 0.0
+
+        return {
+            'queued': sum(not future.done() for _, _, future in cls.waiting),
+            'jobs': cls.jobs,
+            'commits': cls.commits,
+            'wait_interactive': average(cls.waits[cls.INTERACTIVE]),
+            'wait_bulk': average(cls.waits[cls.BULK]),
+            'wait_max': cls.wait_max,
+            'commit_time': average(cls.commit_times),
+        }
+
+
+@asynccontextmanager
+async def db_conn(priority: int = WriteQueue.BULK) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for writes, it runs as a job on the `WriteQueue`.
+    """
+    async with WriteQueue.write(priority) as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def db_read() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session on the read pool, writes through it fail with `query_only` set.
+    """
+    async with read_session() as conn:
+        yield conn
+
+
+explained: set[str] = set()
+
+
+def explain_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    """
+    Logs queries that scan a whole table, each distinct statement is explained once.
+    """
+    if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+        return
+
+    # IN lists of different lengths are the same query.
+    key = re.sub(r'\?(?:, \?)*', '?', statement)
+    if key in explained:
+        return
+    explained.add(key)
+
+    plan = conn.exec_driver_sql(
+        f'EXPLAIN QUERY PLAN {statement}',
+        parameters[0] if executemany else parameters,
+    ).all()
+
+    for row in plan:
+        # Subqueries show up as scans too, only tables are worth a warning.
+        match = re.fullmatch(r'SCAN (\w+)', row[3])
+        if match and match.group(1) in Base.metadata.tables:
+            logs.warning("Query plan has a full table scan (%s): %s", row[3], ' '.join(statement.split()))
 
 
 async def connect_database() -> None:
     async with engine.begin() as conn:
-        await conn.execute(text("PRAGMA journal_mode=WAL;"))
-        await conn.execute(text("PRAGMA busy_timeout=5000;"))
         await conn.run_sync(Base.metadata.create_all)
+        await migrate_database(conn)
+
+    for sync_engine in (engine.sync_engine, read_engine.sync_engine):
+        if Config.DBEXPLAIN and not event.contains(sync_engine, 'before_cursor_execute', explain_query):
+            event.listen(sync_engine, 'before_cursor_execute', explain_query)
 
 
 async def disconnect_database() -> None:
     await engine.dispose()
+    await read_engine.dispose()
@@ -1,5 +1,5 @@
 from fastapi import Depends
-from core.database import db_conn, AsyncGenerator
+from core.database import db_read, AsyncGenerator
 from services.library import LibraryService
 from services.playlist import PlaylistService
 from services.user import UserService
@@ -9,7 +9,7 @@ from repos.user import UserRepo
 
 
 async def get_library_repo() -> AsyncGenerator[LibraryRepo, None]:
-    async with db_conn() as conn:
+    async with db_read() as conn:
         yield LibraryRepo(conn)
 
 
@@ -19,8 +19,10 @@ async def get_library_service(
     return LibraryService(repo)
 
 
+# User and playlist requests read on the read pool too, their services take the writer
+# only around the writes so a request never holds it while reading or hashing passwords.
 async def get_user_repo() -> AsyncGenerator[UserRepo, None]:
-    async with db_conn() as conn:
+    async with db_read() as conn:
         yield UserRepo(conn)
 
 
@@ -31,7 +33,7 @@ async def get_user_service(
 
 
 async def get_playlist_repo() -> AsyncGenerator[PlaylistRepo, None]:
-    async with db_conn() as conn:
+    async with db_read() as conn:
         yield PlaylistRepo(conn)
 
 
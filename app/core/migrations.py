@@ -0,0 +1,130 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from typing import Awaitable, Callable
+from core.logging import logs
+
+Step = str | Callable[[AsyncConnection], Awaitable[None]]
+
+
+def add_column(table: str, column: str, definition: str) -> Step:
+    """
+    Adds a column unless `create_all` already made the table with it, SQLite has no ADD COLUMN IF NOT EXISTS.
+    """
+    async def step(conn: AsyncConnection) -> None:
+        db_query = await conn.execute(text(f'PRAGMA table_info({table})'))
+        if column not in {row.name for row in db_query}:
+            await conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+    return step
+
+
+def count_rows(table: str) -> list[str]:
+    """
+    Keeps the row count of `table` in `counters`, the triggers run in the transaction of the write.
+    """
+    return [
+        f"INSERT INTO counters (name, value) SELECT '{table}', count(*) FROM {table} "
+        f"WHERE true ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+        f"CREATE TRIGGER IF NOT EXISTS tr_{table}_count_insert AFTER INSERT ON {table} "
+        f"BEGIN UPDATE counters SET value = value + 1 WHERE name = '{table}'; END",
+        f"CREATE TRIGGER IF NOT EXISTS tr_{table}_count_delete AFTER DELETE ON {table} "
+        f"BEGIN UPDATE counters SET value = value - 1 WHERE name = '{table}'; END",
+    ]
+
+
+def search_index(table: str, columns: list[str]) -> list[str]:
+    """
+    Creates `{table}_fts`, an FTS5 index over `columns` of `table`, kept in sync by triggers.
+    """
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS tr_{fts}_insert AFTER INSERT ON {table} "
+        f"BEGIN INSERT INTO {fts} (rowid, {names}) VALUES (new.rowid, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS tr_{fts}_delete AFTER DELETE ON {table} "
+        f"BEGIN INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS tr_{fts}_update AFTER UPDATE OF {names} ON {table} "
+        f"BEGIN INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); "
+        f"INSERT INTO {fts} (rowid, {names}) VALUES (new.rowid, {new}); END",
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+
+# Each entry moves the database one version up, the version is kept in `PRAGMA user_version`.
+# Steps must be idempotent: new databases get the current schema from `create_all` and
+# then run every migration on top of it. Never edit a released entry, append a new one.
+MIGRATIONS: list[list[Step]] = [
+    # 1: Indexes for path lookups, joins, aggregation and sorting.
+    [
+        'CREATE INDEX IF NOT EXISTS ix_tracks_filepath ON tracks (filepath)',
+        'CREATE INDEX IF NOT EXISTS ix_tracks_album_id_track_number ON tracks (album_id, track_number)',
+        'CREATE INDEX IF NOT EXISTS ix_tracks_artist_id ON tracks (artist_id)',
+        'CREATE INDEX IF NOT EXISTS ix_tracks_albumartist_id ON tracks (albumartist_id)',
+        'CREATE INDEX IF NOT EXISTS ix_tracks_title ON tracks (title)',
+        'CREATE INDEX IF NOT EXISTS ix_albums_album ON albums (album)',
+        'CREATE INDEX IF NOT EXISTS ix_albums_albumartist_id ON albums (albumartist_id)',
+        'CREATE INDEX IF NOT EXISTS ix_artists_artist ON artists (artist)',
+        'ANALYZE',
+    ],
+    # 2: Sort key and id indexes for keyset pagination, they replace the sort key indexes.
+    [
+        'CREATE INDEX IF NOT EXISTS ix_tracks_title_track_id ON tracks (title, track_id)',
+        'CREATE INDEX IF NOT EXISTS ix_albums_album_album_id ON albums (album, album_id)',
+        'CREATE INDEX IF NOT EXISTS ix_artists_artist_artist_id ON artists (artist, artist_id)',
+        'CREATE INDEX IF NOT EXISTS ix_playlists_user_name_id ON playlists (playlist_user, playlist_name, playlist_id)',
+        'DROP INDEX IF EXISTS ix_tracks_title',
+        'DROP INDEX IF EXISTS ix_albums_album',
+        'DROP INDEX IF EXISTS ix_artists_artist',
+        'ANALYZE',
+    ],
+    # 3: Row counts for listing totals.
+    [
+        *count_rows('tracks'),
+        *count_rows('albums'),
+        *count_rows('artists'),
+        *count_rows('users'),
+    ],
+    # 4: Artist to album relation for artist pages, filled from the existing tracks.
+    [
+        "INSERT OR IGNORE INTO artist_albums (artist_id, album_id) "
+        "SELECT artist_id, album_id FROM tracks WHERE album_id != '' "
+        "UNION SELECT albumartist_id, album_id FROM tracks WHERE album_id != ''",
+    ],
+    # 5: Full-text search.
+    [
+        *search_index('tracks', ['title', 'album', 'artist', 'albumartist', 'composer', 'genre']),
+        *search_index('albums', ['album']),
+        *search_index('artists', ['artist']),
+    ],
+    # 6: Album rows carry what album pages show, so they're read without joins.
+    [
+        add_column('albums', 'albumartist', "VARCHAR NOT NULL DEFAULT ''"),
+        add_column('albums', 'track_total', 'INTEGER NOT NULL DEFAULT 0'),
+        add_column('albums', 'artwork_path', "VARCHAR NOT NULL DEFAULT ''"),
+        "UPDATE albums SET "
+        "albumartist = coalesce((SELECT coalesce(nullif(albumartist, ''), artist) FROM tracks "
+        "WHERE tracks.album_id = albums.album_id AND tracks.albumartist_id = albums.albumartist_id LIMIT 1), ''), "
+        "track_total = (SELECT count(*) FROM tracks WHERE tracks.album_id = albums.album_id), "
+        "artwork_path = coalesce((SELECT min(filepath) FROM tracks WHERE tracks.album_id = albums.album_id), '')",
+    ],
+]
+
+
+async def migrate_database(conn: AsyncConnection) -> None:
+    db_query = await conn.execute(text('PRAGMA user_version'))
+    version = db_query.scalar_one()
+
+    for number, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        for step in steps:
+            if callable(step):
+                await step(conn)
+            else:
+                await conn.execute(text(step))
+
+        await conn.execute(text(f'PRAGMA user_version = {number}'))
+        logs.info("Database migrated to version %d.", number)
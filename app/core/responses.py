@@ -0,0 +1,36 @@
+from typing import Any
+from fastapi import Response
+from core.config import Config
+from core.logging import logs
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(Response):
+    """
+    Serializes plain dicts and lists with orjson, the output matches FastAPI's JSONResponse.
+    """
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def is_fast_json() -> bool:
+    if Config.FASTJSON and orjson is None:
+        logs.warning("FASTJSON is set but orjson isn't installed, using the default responses.")
+        Config.FASTJSON = False
+
+    return Config.FASTJSON
+
+
+def fast_json(content: dict[str, Any]) -> dict[str, Any] | FastJSONResponse:
+    """
+    Returns listing rows as they come from the repo without validating them against the
+    response model, if `FASTJSON` is set. The rows must already have the model's fields,
+    order and types, so the JSON is the same either way.
+    """
+    return FastJSONResponse(content) if is_fast_json() else content
@@ -1,5 +1,5 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, Request, status
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -12,8 +12,11 @@ from api import api_router
 from core.config import Config
 from core.database import connect_database, disconnect_database
 from core.logging import log_file_handler, logs
+from core.responses import is_fast_json
 from core.middleware import CustomSessionMiddleware
+from services.library_extract import LibraryExtract
 from services.scanner import scanner, tracker
+from tools.convert_value import InvalidCursor
 from tools.path_handler import create_dir, get_path
 
 
@@ -27,6 +30,9 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, Any]:
     create_dir(Config)
     log = log_file_handler()
     await connect_database()
+    LibraryExtract.start()
+    # Warns now rather than on the first listing if FASTJSON can't be used.
+    is_fast_json()
 
     asyncio.create_task(scanner())
     asyncio.create_task(tracker())
@@ -44,6 +50,8 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, Any]:
             if isinstance(result, Exception) and not isinstance(result, asyncio.CancelledError):
                 logs.error(f"Error During Shutdown, {result}")
 
+        LibraryExtract.shutdown()
+
 
 app = FastAPI(
     title='mixel-music',
@@ -84,6 +92,11 @@ app.add_middleware(CustomSessionMiddleware)
 app.include_router(api_router)
 
 
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor(request: Request, error: InvalidCursor) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={'detail': str(error)})
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -1,5 +1,7 @@
 from models.album import Album
-from models.artist import Artist
+from models.artist import Artist, ArtistAlbum
+from models.counter import Counter
+from models.manifest import Manifest
 from models.playlist import Playlist, PlaylistData
 from models.setting import Setting
 from models.track import Track
@@ -1,17 +1,24 @@
-from sqlalchemy import Column, Integer, String, REAL
+from typing import Optional
+from sqlalchemy import Column, Integer, String, REAL, Index
 from pydantic import BaseModel
 from core.database import Base
 
 
 class Album(Base):
     __tablename__ = 'albums'
+    __table_args__ = (
+        Index('ix_albums_album_album_id', 'album', 'album_id'),
+    )
 
     album: str = Column(String, nullable=False)
     album_id: str = Column(String(32), primary_key=True, nullable=False)
-    albumartist_id: str = Column(String(32), nullable=False)
+    albumartist: str = Column(String, nullable=False, server_default='')
+    albumartist_id: str = Column(String(32), nullable=False, index=True)
+    artwork_path: str = Column(String, nullable=False, server_default='')
     disc_total: int = Column(Integer, nullable=False)
     duration_total: float = Column(REAL, nullable=False)
     filesize_total: int = Column(Integer, nullable=False)
+    track_total: int = Column(Integer, nullable=False, server_default='0')
     year: int = Column(String, nullable=False)
 
 
@@ -23,6 +30,7 @@ class AlbumModel(BaseModel):
     disc_total: int
     duration_total: float
     filesize_total: int
+    track_total: int
     year: int
 
 
@@ -51,3 +59,4 @@ class AlbumResponseModel(AlbumModel):
 class AlbumsResponseModel(BaseModel):
     albums: list[AlbumsModel]
     total: int
+    next_cursor: Optional[str] = None
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, String, REAL, Integer
+from typing import Optional
+from sqlalchemy import Column, String, REAL, Integer, Index
 from pydantic import BaseModel, Field
 from core.database import Base
 
 
 class Artist(Base):
     __tablename__ = 'artists'
+    __table_args__ = (
+        Index('ix_artists_artist_artist_id', 'artist', 'artist_id'),
+    )
 
     artist: str = Column(String, nullable=False)
     artist_id: str = Column(String(32), primary_key=True, nullable=False)
@@ -14,6 +18,16 @@ class Artist(Base):
     filesize_total: int = Column(Integer, nullable=False)
 
 
+class ArtistAlbum(Base):
+    """
+    Albums an artist appears on as track artist or album artist, kept up to date by album aggregation.
+    """
+    __tablename__ = 'artist_albums'
+
+    artist_id: str = Column(String(32), primary_key=True, nullable=False)
+    album_id: str = Column(String(32), primary_key=True, nullable=False, index=True)
+
+
 class ArtistModel(BaseModel):
     artist: str
     artist_id: str
@@ -46,3 +60,4 @@ class ArtistResponseModel(ArtistModel):
 class ArtistsResponseModel(BaseModel):
     artists: list[ArtistsModel]
     total: int
+    next_cursor: Optional[str] = None
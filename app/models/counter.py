@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String
+from core.database import Base
+
+
+class Counter(Base):
+    __tablename__ = 'counters'
+
+    name: str = Column(String, primary_key=True, nullable=False)
+    value: int = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from core.database import Base
+
+
+class Manifest(Base):
+    __tablename__ = 'manifest'
+
+    filepath: str = Column(String, primary_key=True, nullable=False)
+    filesize: int = Column(Integer, nullable=False)
+    mtime_ns: int = Column(Integer, nullable=False)
+    inode: int = Column(Integer, nullable=False)
+    tag_version: int = Column(Integer, nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from pydantic import BaseModel, Field
@@ -10,6 +10,9 @@ from typing import Optional
 
 class Playlist(Base):
     __tablename__ = 'playlists'
+    __table_args__ = (
+        Index('ix_playlists_user_name_id', 'playlist_user', 'playlist_name', 'playlist_id'),
+    )
 
     playlist_id: str = Column(String, primary_key=True, nullable=False)
     playlist_name: str = Column(String, nullable=False)
@@ -78,6 +81,7 @@ class PlaylistCreateModel(BaseModel):
 class PlaylistsResponseModel(BaseModel):
     playlists: list[PlaylistModel]
     total: int
+    next_cursor: Optional[str] = None
 
 
 class PlaylistResponseModel(PlaylistModel):
@@ -0,0 +1,79 @@
+from enum import Enum
+from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class ScanPhaseEnum(str, Enum):
+    IDLE = 'idle'
+    RECONCILING = 'reconciling'
+    WALKING = 'walking'
+    EXTRACTING = 'extracting'
+    WRITING = 'writing'
+    AGGREGATING = 'aggregating'
+
+
+class ScanQueuesModel(BaseModel):
+    walk: int
+    filter: int
+    extract: int
+    write: int
+    aggregate: int
+
+
+class ScanWritesModel(BaseModel):
+    queued: int
+    jobs: int
+    commits: int
+    wait_interactive: float
+    wait_bulk: float
+    wait_max: float
+    commit_time: float
+
+
+class ScanExtractModel(BaseModel):
+    workers: int
+    queued: int
+    processed: int
+    failed: int
+    throughput: float
+
+
+class ScanAggregationModel(BaseModel):
+    running: bool
+    pending: bool
+    coalesced: int
+    last_duration: float
+
+
+class ScanRootModel(BaseModel):
+    path: str
+    online: bool
+    scanning: bool
+    watching: bool
+    discovered: int
+    scanned_at: Optional[datetime]
+    scan_duration: Optional[float]
+    error: Optional[str]
+
+
+class ScanStatusModel(BaseModel):
+    phase: ScanPhaseEnum
+    started_at: Optional[datetime]
+    elapsed: float
+    discovered: int
+    processed: int
+    failed: int
+    written: int
+    files_per_second: float
+    eta: Optional[float]
+    queues: ScanQueuesModel
+    writes: ScanWritesModel
+    extract: ScanExtractModel
+    aggregation: ScanAggregationModel
+    roots: list[ScanRootModel]
+
+
+class ScanPromoteModel(BaseModel):
+    path: str
+    promoted: bool
@@ -0,0 +1,25 @@
+from sqlalchemy import table, column
+from pydantic import BaseModel
+from models.album import AlbumsModel
+from models.artist import ArtistsModel
+from models.track import TracksModel
+
+# FTS5 tables are virtual tables that create_all can't make, migration 5 creates them.
+tracks_fts = table(
+    'tracks_fts',
+    column('rowid'),
+    column('title'),
+    column('album'),
+    column('artist'),
+    column('albumartist'),
+    column('composer'),
+    column('genre'),
+)
+albums_fts = table('albums_fts', column('rowid'), column('album'))
+artists_fts = table('artists_fts', column('rowid'), column('artist'))
+
+
+class SearchResponseModel(BaseModel):
+    tracks: list[TracksModel]
+    albums: list[AlbumsModel]
+    artists: list[ArtistsModel]
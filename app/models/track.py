@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Boolean, ForeignKey, REAL, Text, func
+    Column, Integer, String, DateTime, Boolean, ForeignKey, REAL, Text, Index, func
 )
 from datetime import datetime, timezone
 from pydantic import BaseModel, Field
@@ -9,13 +9,17 @@ from typing import Optional
 
 class Track(Base):
     __tablename__ = 'tracks'
+    __table_args__ = (
+        Index('ix_tracks_album_id_track_number', 'album_id', 'track_number'),
+        Index('ix_tracks_title_track_id', 'title', 'track_id'),
+    )
 
     album: str = Column(String, ForeignKey('albums.album'), nullable=False)
     album_id: str = Column(String(32), nullable=False)
     albumartist: str = Column(String, nullable=False)
-    albumartist_id: str = Column(String(32), nullable=False)
+    albumartist_id: str = Column(String(32), nullable=False, index=True)
     artist: str = Column(String, nullable=False)
-    artist_id: str = Column(String(32), nullable=False)
+    artist_id: str = Column(String(32), nullable=False, index=True)
     barcode: str = Column(String, nullable=False)
     bitdepth: int = Column(Integer, nullable=False)
     bitrate: float = Column(REAL, nullable=False)
@@ -36,7 +40,7 @@ class Track(Base):
     duration: float = Column(REAL, nullable=False)
     disc_number: int = Column(Integer, nullable=False)
     disc_total: int = Column(Integer, nullable=False)
-    filepath: str = Column(String, nullable=False)
+    filepath: str = Column(String, nullable=False, index=True)
     filesize: int = Column(Integer, nullable=False)
     genre: str = Column(String, nullable=False)
     isrc: str = Column(String(12), nullable=False)
@@ -115,3 +119,4 @@ class TrackResponseModel(TrackModel):
 class TracksResponseModel(BaseModel):
     tracks: list[TracksModel]
     total: int
+    next_cursor: Optional[str] = None
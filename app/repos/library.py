@@ -3,13 +3,25 @@ from core.database import (
     select,
     insert,
     Insert,
+    update,
     delete,
     NoResultFound,
     or_,
     join,
     func,
+    exists,
+    literal,
+    literal_column,
+    bindparam,
+    tuple_,
+    union,
+    union_all,
+    cast,
+    Integer,
 )
-from models import Album, Artist, Track
+from models import Album, Artist, ArtistAlbum, Counter, Manifest, PlaylistData, Track
+from models.search import tracks_fts, albums_fts, artists_fts
+from datetime import datetime, timezone
 from typing import Any
 
 class LibraryRepo:
@@ -17,8 +29,18 @@ class LibraryRepo:
         self.conn = conn
 
 
-    async def get_tracks(self, start: int, end: int) -> tuple[list[dict[str, Any]], int]:
+    async def get_total(self, table: str) -> int:
+        """
+        Returns the row count of a table from `counters`, which triggers keep up to date.
+        """
         db_query = await self.conn.execute(
+            select(Counter.value).where(Counter.name == table)
+        )
+        return db_query.scalar_one_or_none() or 0
+
+
+    async def get_tracks(self, start: int, end: int, after: tuple[str, str] | None = None) -> tuple[list[dict[str, Any]], int]:
+        track_query = (
             select(
                 Track.album,
                 Track.album_id,
@@ -28,16 +50,21 @@ class LibraryRepo:
                 Track.title,
                 Track.track_id,
             )
-            .order_by(Track.title.asc())
-            .offset(start - 1)
+            .order_by(Track.title.asc(), Track.track_id.asc())
             .limit(end - (start - 1))
         )
+
+        # With a cursor the page starts after the last row of the previous one, so the
+        # index is seeked instead of skipping `start` rows.
+        if after:
+            track_query = track_query.where(tuple_(Track.title, Track.track_id) > tuple_(*after))
+        else:
+            track_query = track_query.offset(start - 1)
+
+        db_query = await self.conn.execute(track_query)
         track_list = [dict(row) for row in db_query.mappings().all()]
 
-        total_query = await self.conn.execute(
-            select(func.count()).select_from(Track)
-        )
-        total = total_query.scalar_one()
+        total = await self.get_total(Track.__tablename__)
         return track_list, total
     
 
@@ -54,153 +81,304 @@ class LibraryRepo:
             raise NoResultFound
 
 
-    async def get_albums(self, start: int, end: int) -> tuple[list[dict[str, Any]], int]:
-        album_query = await self.conn.execute(
+    async def get_albums(self, start: int, end: int, after: tuple[str, str] | None = None) -> tuple[list[dict[str, Any]], int]:
+        album_query = (
             select(
                 Album.album,
                 Album.album_id,
-                Artist.artist.label('albumartist'),
+                Album.albumartist,
                 Album.albumartist_id,
-                Album.year,
-            )
-            .select_from(
-                join(
-                    Album, Artist,
-                    Album.albumartist_id == Artist.artist_id
-                )
+                # Stored as text, listings return it as the integer their models declare.
+                cast(Album.year, Integer).label('year'),
             )
-            .order_by(Album.album.asc())
-            .offset(start - 1)
+            # Tracks without an album tag are grouped into untitled albums, which aren't listed.
+            .where(Album.album != '')
+            .order_by(Album.album.asc(), Album.album_id.asc())
             .limit(end - (start - 1))
         )
+
+        if after:
+            album_query = album_query.where(tuple_(Album.album, Album.album_id) > tuple_(*after))
+        else:
+            album_query = album_query.offset(start - 1)
+
+        album_query = await self.conn.execute(album_query)
         album_list = [dict(row) for row in album_query.mappings().all()]
 
-        total_query = await self.conn.execute(
-            select(func.count()).select_from(Album)
-        )
-        total = total_query.scalar_one()
+        total = await self.get_total(Album.__tablename__)
         return album_list, total
     
 
     async def get_album(self, album_id: str) -> dict[str, list[dict[str, Any] | None] | Any]:
         album_item = {}
-        album_query = await self.conn.execute(
-            select(
-                Album.__table__,
-                Artist.artist.label('albumartist')
-            )
-            .select_from(
-                join(
-                    Album, Artist,
-                    Album.albumartist_id == Artist.artist_id
-                )
-            )
+        album_columns = (
+            Album.album,
+            Album.album_id,
+            Album.albumartist,
+            Album.albumartist_id,
+            Album.artwork_path,
+            Album.disc_total,
+            Album.duration_total,
+            Album.filesize_total,
+            Album.track_total,
+            Album.year,
+        )
+        track_columns = (
+            Track.artist,
+            Track.artist_id,
+            Track.comment,
+            Track.duration,
+            Track.title,
+            Track.track_id,
+            Track.track_number,
+        )
+        # The album row is repeated on each of its tracks, one lookup serves the whole page.
+        db_query = await self.conn.execute(
+            select(*album_columns, *track_columns)
+            .select_from(Album)
+            .outerjoin(Track, Track.album_id == Album.album_id)
             .where(Album.album_id == album_id)
+            .order_by(Track.track_number.asc())
         )
-        
-        album_item = album_query.mappings().first()
-        if album_item:
-            album_item = dict(album_item)
+        rows = db_query.mappings().all()
+
+        if not rows:
+            raise NoResultFound
+
+        album_item = {column.key: rows[0][column.key] for column in album_columns}
+        album_item['tracks'] = [
+            {column.key: row[column.key] for column in track_columns}
+            for row in rows if row['track_id'] is not None
+        ]
+        return album_item
+
+
+    async def get_artists(self, start: int, end: int, after: tuple[str, str] | None = None) -> tuple[list[dict[str, Any]], int]:
+        artist_query = (
+            select(Artist.__table__)
+            .order_by(Artist.artist.asc(), Artist.artist_id.asc())
+            .limit(end - (start - 1))
+        )
+
+        if after:
+            artist_query = artist_query.where(tuple_(Artist.artist, Artist.artist_id) > tuple_(*after))
         else:
+            artist_query = artist_query.offset(start - 1)
+
+        db_query = await self.conn.execute(artist_query)
+        artist_list = [dict(row) for row in db_query.mappings().all()]
+
+        total = await self.get_total(Artist.__tablename__)
+        return artist_list, total
+
+
+    async def get_artist(self, artist_id: str) -> dict[str, list[dict[str, Any]] | Any]:
+        artist_item = {}
+        # Every row carries the album artist of its album, the first album's is the one shown.
+        db_query = await self.conn.execute(
+            select(
+                Album.album,
+                Album.album_id,
+                Album.albumartist_id,
+                Album.year,
+                Artist.artist,
+                Artist.album_total,
+                Artist.track_total,
+                Artist.duration_total,
+                Artist.filesize_total,
+            )
+            .select_from(ArtistAlbum)
+            .join(Album, Album.album_id == ArtistAlbum.album_id)
+            .join(Artist, Artist.artist_id == Album.albumartist_id)
+            .where(ArtistAlbum.artist_id == artist_id)
+            .order_by(Album.year.asc())
+        )
+        rows = db_query.mappings().all()
+
+        if not rows:
             raise NoResultFound
 
-        track_query = await self.conn.execute(
+        artist_data = rows[0]
+        artist_item = {
+            'artist': artist_data['artist'],
+            'artist_id': artist_id,
+            'album_total': artist_data['album_total'],
+            'track_total': artist_data['track_total'],
+            'duration_total': artist_data['duration_total'],
+            'filesize_total': artist_data['filesize_total'],
+            'albums': [
+                {
+                    'album': row['album'],
+                    'album_id': row['album_id'],
+                    'albumartist_id': row['albumartist_id'],
+                    'year': row['year'],
+                }
+                for row in rows
+            ],
+        }
+
+        return artist_item
+    
+
+    @staticmethod
+    def ranked_matches(fts: Any, match: str, limit: int, *weights: float) -> Any:
+        """
+        Returns the `limit` best rows of `fts` for `match`, ranked inside the index so only
+        the rows that are returned get joined to their table.
+        """
+        fts_column = literal_column(fts.name)
+        score = func.bm25(fts_column, *weights)
+
+        return (
+            select(fts.c.rowid, score.label('score'))
+            .where(fts_column.op('MATCH')(match))
+            .order_by(score)
+            .limit(limit)
+            .subquery()
+        )
+
+
+    async def search_tracks(self, match: str, limit: int) -> list[dict[str, Any]]:
+        """
+        Returns the best tracks for an FTS5 query, a title hit ranks above an artist or album hit.
+        """
+        ranked = self.ranked_matches(tracks_fts, match, limit, 10.0, 5.0, 5.0, 3.0, 1.0, 1.0)
+        db_query = await self.conn.execute(
             select(
+                Track.album,
+                Track.album_id,
                 Track.artist,
                 Track.artist_id,
-                Track.comment,
                 Track.duration,
                 Track.title,
                 Track.track_id,
-                Track.track_number,
             )
-            .where(Track.album_id == album_id)
-            .order_by(Track.track_number.asc())
+            .select_from(ranked)
+            .join(Track, literal_column('tracks.rowid') == ranked.c.rowid)
+            .order_by(ranked.c.score)
+            .limit(limit)
         )
-        album_item['tracks'] = [dict(row) for row in track_query.mappings().all()]
-        return album_item
+        return [dict(row) for row in db_query.mappings().all()]
 
 
-    async def get_artists(self, start: int, end: int) -> tuple[list[dict[str, Any]], int]:
+    async def search_albums(self, match: str, limit: int) -> list[dict[str, Any]]:
+        ranked = self.ranked_matches(albums_fts, match, limit)
+        db_query = await self.conn.execute(
+            select(
+                Album.album,
+                Album.album_id,
+                Album.albumartist,
+                Album.albumartist_id,
+                # Stored as text, listings return it as the integer their models declare.
+                cast(Album.year, Integer).label('year'),
+            )
+            .select_from(ranked)
+            .join(Album, literal_column('albums.rowid') == ranked.c.rowid)
+            .order_by(ranked.c.score)
+            .limit(limit)
+        )
+        return [dict(row) for row in db_query.mappings().all()]
+
+
+    async def search_artists(self, match: str, limit: int) -> list[dict[str, Any]]:
+        ranked = self.ranked_matches(artists_fts, match, limit)
         db_query = await self.conn.execute(
             select(Artist.__table__)
-            .order_by(Artist.artist.asc())
-            .offset(start - 1)
-            .limit(end - (start - 1))
+            .select_from(ranked)
+            .join(Artist, literal_column('artists.rowid') == ranked.c.rowid)
+            .order_by(ranked.c.score)
+            .limit(limit)
         )
-        artist_list = [dict(row) for row in db_query.mappings().all()]
+        return [dict(row) for row in db_query.mappings().all()]
+
+
+    async def get_manifest(self, after: str = '', limit: int = 1000, before: str | None = None) -> Any:
+        """
+        Returns manifest rows ordered by filepath, starting after `after` and optionally
+        stopping before `before`, so callers can page through the table with bounded memory.
+        """
+        db_query = (
+            select(Manifest.__table__)
+            .where(Manifest.filepath > after)
+            .order_by(Manifest.filepath.asc())
+            .limit(limit)
+        )
+        if before is not None:
+            db_query = db_query.where(Manifest.filepath < before)
+
+        result = await self.conn.execute(db_query)
+        return result.all()
+
 
-        total_query = await self.conn.execute(
-            select(func.count()).select_from(Artist)
+    async def get_manifest_by_paths(self, filepaths: list[str]) -> dict[str, Any]:
+        result = await self.conn.execute(
+            select(Manifest.__table__).where(Manifest.filepath.in_(filepaths))
         )
-        total = total_query.scalar_one()
-        return artist_list, total
+        return {row.filepath: row for row in result.all()}
 
 
-    async def get_artist(self, artist_id: str) -> dict[str, list[dict[str, Any]] | Any]:
-        artist_item = {}
-        track_query = await self.conn.execute(
-            select(Track.album_id)
-            .where(or_(Track.artist_id == artist_id, Track.albumartist_id == artist_id))
-        )
-        tracks_data = track_query.mappings().all()
-
-        if tracks_data:
-            # 해당 아이템 있으면 album_id 사용하여 앨범 검색
-            album_ids = [track['album_id'] for track in tracks_data]
-            album_from_tracks_query = await self.conn.execute(
-                select(
-                    Album.album,
-                    Album.album_id,
-                    Album.albumartist_id,
-                    Album.year,
-                )
-                .where(Album.album_id.in_(album_ids))
-                .order_by(Album.year.asc())
+    async def get_manifest_under(self, directory: str) -> dict[str, Any]:
+        # '0' sorts right after '/', so the range covers exactly the paths inside the directory.
+        result = await self.conn.execute(
+            select(Manifest.__table__)
+            .where(Manifest.filepath > f'{directory}/', Manifest.filepath < f'{directory}0')
+        )
+        return {row.filepath: row for row in result.all()}
+
+
+    async def backfill_manifest(self) -> None:
+        """
+        Registers tracks scanned before the manifest existed with an empty fingerprint,
+        so the next scan re-reads them once and records their real fingerprint.
+        """
+        await self.conn.execute(
+            Insert(Manifest)
+            .from_select(
+                ['filepath', 'filesize', 'mtime_ns', 'inode', 'tag_version'],
+                select(Track.filepath, Track.filesize, literal(0), literal(0), literal(0))
+                .where(~exists().where(Manifest.filepath == Track.filepath))
             )
-            
-            albums_data = album_from_tracks_query.mappings().all()
-            albums_data = [dict(album) for album in albums_data]
-
-            if albums_data:
-                album = albums_data[0]
-                
-                # 앨범 albumartist_id 이용하여 아티스트 조회
-                artist_query = await self.conn.execute(
-                    select(Artist.__table__)
-                    .where(Artist.artist_id == album['albumartist_id'])
-                )
-                artist_data = artist_query.mappings().first()
-
-                if artist_data:
-                    artist_item = {
-                        'artist': artist_data['artist'],
-                        'artist_id': artist_id,
-                        'album_total': artist_data['album_total'],
-                        'track_total': artist_data['track_total'],
-                        'duration_total': artist_data['duration_total'],
-                        'filesize_total': artist_data['filesize_total'],
-                        'albums': albums_data
-                    }
-        else:
-            raise NoResultFound
+            .on_conflict_do_nothing()
+        )
 
-        return artist_item
-    
 
-    async def get_scan_info(self) -> Any:
-        result = await self.conn.execute(select(Track.filepath, Track.filesize))
-        result = result.all()
+    async def get_track_groups(self, track_ids: list[str]) -> Any:
+        result = await self.conn.execute(
+            select(Track.album_id, Track.albumartist_id)
+            .where(Track.track_id.in_(track_ids))
+            .distinct()
+        )
+        return result.all()
 
-        return result
-    
 
-    async def get_item_path(self, id: str) -> dict[Any, Any]:
+    async def get_tracks_by_paths(self, filepaths: list[str]) -> Any:
         result = await self.conn.execute(
-            select(Track.filepath)
-            .where(
-                or_(Track.album_id == id, Track.track_id == id)
+            select(
+                Track.album,
+                Track.album_id,
+                Track.albumartist,
+                Track.albumartist_id,
+                Track.artist,
+                Track.disc_total,
+                Track.filepath,
+                Track.track_id,
+                Track.track_total,
             )
+            .where(Track.filepath.in_(filepaths))
+        )
+        return result.all()
+
+
+    async def get_item_path(self, id: str) -> dict[Any, Any]:
+        # Albums keep the path their artwork is read from, tracks cover albums not aggregated yet.
+        paths = union_all(
+            select(Album.artwork_path.label('filepath'), literal(0).label('source'))
+            .where(Album.album_id == id, Album.artwork_path != ''),
+            select(Track.filepath, literal(1).label('source'))
+            .where(or_(Track.album_id == id, Track.track_id == id)),
+        ).subquery()
+        result = await self.conn.execute(
+            select(paths.c.filepath).order_by(paths.c.source).limit(1)
         )
 
         data = result.mappings().first()
@@ -216,26 +394,109 @@ class LibraryRepo:
         return row if row else ''
 
 
+    async def get_stream(self, track_id: str) -> dict[str, Any] | None:
+        """
+        Returns the few columns the streaming endpoint needs, without lyrics and comments.
+        """
+        result = await self.conn.execute(
+            select(Track.content_type, Track.filepath, Track.title)
+            .where(Track.track_id == track_id)
+        )
+
+        row = result.mappings().first()
+        return dict(row) if row else None
+
+
     async def insert_track(self, track_data: dict[str, Any]) -> None:
         await self.conn.execute(
             insert(Track).values(**track_data)
         )
 
 
-    async def insert_album(self, album_data: dict[str, Any]) -> None:
+    async def upsert_tracks(self, track_list: list[dict[str, Any]]) -> tuple[int, int]:
+        """
+        Writes a batch of tracks with a single executemany upsert keyed on `track_id`.
+
+        Returns the number of inserted and updated rows.
+        """
+        track_ids = [track['track_id'] for track in track_list]
+        exist_query = await self.conn.execute(
+            select(Track.track_id).where(Track.track_id.in_(track_ids))
+        )
+        updated = len(exist_query.scalars().all())
+
+        stmt = Insert(Track)
+        update_data = {
+            key: stmt.excluded[key] for key in track_list[0] if key != 'track_id'
+        }
+        update_data['updated_at'] = datetime.now(timezone.utc)
+
+        await self.conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=['track_id'],
+                set_=update_data,
+            ),
+            track_list,
+        )
+        return len(track_list) - updated, updated
+
+
+    async def upsert_manifest(self, manifest_list: list[dict[str, Any]]) -> None:
+        stmt = Insert(Manifest)
         await self.conn.execute(
-            Insert(Album).values(**album_data).on_conflict_do_nothing()
+            stmt.on_conflict_do_update(
+                index_elements=['filepath'],
+                set_={key: stmt.excluded[key] for key in manifest_list[0] if key != 'filepath'},
+            ),
+            manifest_list,
         )
 
 
-    async def insert_artist(self, artist_data: dict[str, Any]) -> None:
+    async def upsert_albums(self, album_list: list[dict[str, Any]]) -> None:
+        stmt = Insert(Album)
         await self.conn.execute(
-            Insert(Artist)
-            .values(**artist_data)
-            .on_conflict_do_update(
+            stmt.on_conflict_do_update(
+                index_elements=['album_id'],
+                set_={key: stmt.excluded[key] for key in album_list[0] if key != 'album_id'},
+            ),
+            album_list,
+        )
+
+
+    async def upsert_artists(self, artist_list: list[dict[str, Any]]) -> None:
+        stmt = Insert(Artist)
+        await self.conn.execute(
+            stmt.on_conflict_do_update(
                 index_elements=['artist_id'],
-                set_=artist_data
-            )
+                set_={key: stmt.excluded[key] for key in artist_list[0] if key != 'artist_id'},
+            ),
+            artist_list,
+        )
+
+
+    async def move_tracks(self, move_list: list[dict[str, Any]]) -> None:
+        """
+        Points tracks at their new path in place, keyed on `old_track_id`.
+
+        The track id is derived from the path, so playlist entries are moved to the new id as well.
+        """
+        await self.conn.execute(
+            update(Track.__table__)
+            .where(Track.track_id == bindparam('old_track_id'))
+            .values(
+                track_id=bindparam('new_track_id'),
+                album_id=bindparam('new_album_id'),
+                directory=bindparam('new_directory'),
+                filepath=bindparam('new_filepath'),
+                updated_at=datetime.now(timezone.utc),
+            ),
+            move_list,
+        )
+        await self.conn.execute(
+            update(PlaylistData.__table__)
+            .where(PlaylistData.track_id == bindparam('old_track_id'))
+            .values(track_id=bindparam('new_track_id')),
+            move_list,
         )
 
 
@@ -245,13 +506,57 @@ class LibraryRepo:
         )
 
 
-    async def delete_album(self, album_id: str) -> None:
+    async def delete_tracks(self, filepaths: list[str]) -> None:
         await self.conn.execute(
-            delete(Album).where(Album.album_id == album_id)
+            delete(Track).where(Track.filepath.in_(filepaths))
         )
 
 
-    async def delete_artist(self, artist_id: str) -> None:
+    async def delete_manifest(self, filepaths: list[str]) -> None:
         await self.conn.execute(
-            delete(Artist).where(Artist.artist_id == artist_id)
+            delete(Manifest).where(Manifest.filepath.in_(filepaths))
         )
+
+
+    async def delete_orphan_albums(self, album_ids: list[str] | None = None) -> None:
+        """
+        Deletes albums without tracks, limited to `album_ids` if given.
+        """
+        db_query = delete(Album).where(~exists().where(Track.album_id == Album.album_id))
+        if album_ids is not None:
+            db_query = db_query.where(Album.album_id.in_(album_ids))
+
+        await self.conn.execute(db_query)
+
+
+    async def replace_artist_albums(self, album_ids: list[str] | None = None) -> None:
+        """
+        Rebuilds the artist to album relation from the tracks, limited to `album_ids` if given.
+        """
+        db_query = delete(ArtistAlbum)
+        track_artists = select(Track.artist_id, Track.album_id).where(Track.album_id != '')
+        album_artists = select(Track.albumartist_id, Track.album_id).where(Track.album_id != '')
+
+        if album_ids is not None:
+            db_query = db_query.where(ArtistAlbum.album_id.in_(album_ids))
+            track_artists = track_artists.where(Track.album_id.in_(album_ids))
+            album_artists = album_artists.where(Track.album_id.in_(album_ids))
+
+        await self.conn.execute(db_query)
+        await self.conn.execute(
+            insert(ArtistAlbum).from_select(
+                ['artist_id', 'album_id'],
+                union(track_artists, album_artists),
+            )
+        )
+
+
+    async def delete_orphan_artists(self, artist_ids: list[str] | None = None) -> None:
+        """
+        Deletes artists that are no longer the album artist of any track, limited to `artist_ids` if given.
+        """
+        db_query = delete(Artist).where(~exists().where(Track.albumartist_id == Artist.artist_id))
+        if artist_ids is not None:
+            db_query = db_query.where(Artist.artist_id.in_(artist_ids))
+
+        await self.conn.execute(db_query)
@@ -14,6 +14,7 @@ from core.database import (
     or_,
     join,
     func,
+    tuple_,
 )
 
 class PlaylistRepo:
@@ -21,14 +22,20 @@ class PlaylistRepo:
         self.conn = conn
 
     
-    async def get_playlists(self, user_id: str, start: int, end: int) -> tuple[list[dict[str, Any]], int]:
-        db_query = await self.conn.execute(
+    async def get_playlists(self, user_id: str, start: int, end: int, after: tuple[str, str] | None = None) -> tuple[list[dict[str, Any]], int]:
+        playlist_query = (
             select(Playlist.__table__)
-            .order_by(Playlist.playlist_name.asc())
-            .offset(start - 1)
+            .order_by(Playlist.playlist_name.asc(), Playlist.playlist_id.asc())
             .limit(end - (start - 1))
             .where(Playlist.playlist_user == user_id)
         )
+
+        if after:
+            playlist_query = playlist_query.where(tuple_(Playlist.playlist_name, Playlist.playlist_id) > tuple_(*after))
+        else:
+            playlist_query = playlist_query.offset(start - 1)
+
+        db_query = await self.conn.execute(playlist_query)
         playlist_list = [dict(row) for row in db_query.mappings().all()]
 
         total_query = await self.conn.execute(
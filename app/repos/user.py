@@ -1,7 +1,7 @@
 from typing import Any
-from models import User
+from models import Counter, User
 from core.database import (
-    AsyncConnection, select, insert, update, delete, func, NoResultFound
+    AsyncConnection, select, insert, update, delete, NoResultFound
 )
 
 class UserRepo:
@@ -42,9 +42,9 @@ class UserRepo:
         users = users_query.mappings().all()
 
         total_query = await self.conn.execute(
-            select(func.count()).select_from(User)
+            select(Counter.value).where(Counter.name == User.__tablename__)
         )
-        total_query = total_query.scalar_one()
+        total_query = total_query.scalar_one_or_none() or 0
         return users, total_query
 
 
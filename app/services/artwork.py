@@ -3,6 +3,7 @@ from PIL import Image
 from concurrent.futures import ThreadPoolExecutor
 from core.config import Config
 from repos.library import LibraryRepo
+from services.library_pipeline import LibraryPipeline
 from tools.path_handler import str_path, get_path, is_excluded_file, Path
 from tools.tags_handler import extract_artwork
 
@@ -55,6 +56,9 @@ class ArtworkService:
             artwork_path = get_path(data.get('filepath')).parent
         except:
             return None
+
+        # During an import, the rest of an album that is being looked at is read next.
+        LibraryPipeline.promote_directory(str_path(artwork_path))
     
         loop = asyncio.get_running_loop()
         for fs in artwork_path.iterdir():
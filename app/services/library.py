@@ -1,10 +1,13 @@
 import aiofiles
+import aiofiles.os
 from typing import Any
 from fastapi import HTTPException, status
 from core.database import NoResultFound
 from core.logging import logs
 from repos.library import LibraryRepo
 from tools.path_handler import get_path
+from tools.convert_value import page_after, page_cursor, fts_query
+from services.stream_cache import StreamCache
 
 
 class LibraryService:
@@ -12,11 +15,13 @@ class LibraryService:
         self.repo = repo
 
 
-    async def get_tracks(self, start: int, end: int) -> dict[str, list[dict[str, Any]] | int]:
-        tracks, total = await self.repo.get_tracks(start, end)
+    async def get_tracks(self, start: int, end: int, cursor: str | None = None) -> dict[str, list[dict[str, Any]] | int | str | None]:
+        tracks, total = await self.repo.get_tracks(start, end, page_after(cursor))
+
         return {
             "tracks": tracks,
-            "total": total
+            "total": total,
+            "next_cursor": page_cursor(tracks, ('title', 'track_id'), start, end)
         }
 
 
@@ -27,11 +32,13 @@ class LibraryService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
         
 
-    async def get_albums(self, start: int, end: int) -> dict[str, list[dict[str, Any]] | int]:
-        albums, total = await self.repo.get_albums(start, end)
+    async def get_albums(self, start: int, end: int, cursor: str | None = None) -> dict[str, list[dict[str, Any]] | int | str | None]:
+        albums, total = await self.repo.get_albums(start, end, page_after(cursor))
+
         return {
             "albums": albums,
-            "total": total
+            "total": total,
+            "next_cursor": page_cursor(albums, ('album', 'album_id'), start, end)
         }
 
 
@@ -42,11 +49,13 @@ class LibraryService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
-    async def get_artists(self, start: int, end: int) -> dict[str, list[dict[str, Any]] | int]:
-        artists, total = await self.repo.get_artists(start, end)
+    async def get_artists(self, start: int, end: int, cursor: str | None = None) -> dict[str, list[dict[str, Any]] | int | str | None]:
+        artists, total = await self.repo.get_artists(start, end, page_after(cursor))
+
         return {
             "artists": artists,
-            "total": total
+            "total": total,
+            "next_cursor": page_cursor(artists, ('artist', 'artist_id'), start, end)
         }
 
 
@@ -57,17 +66,52 @@ class LibraryService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     
 
-    async def streaming(self, track_id: str, range: str) -> tuple[bytes, dict[str, Any]]:
+    async def search(self, query: str, limit: int) -> dict[str, list[dict[str, Any]]]:
+        match = fts_query(query)
+        if not match:
+            return {"tracks": [], "albums": [], "artists": []}
+
+        return {
+            "tracks": await self.repo.search_tracks(match, limit),
+            "albums": await self.repo.search_albums(match, limit),
+            "artists": await self.repo.search_artists(match, limit),
+        }
+
+
+    async def get_stream(self, track_id: str) -> dict[str, Any]:
+        """
+        Returns the stream descriptor of a track, from `StreamCache` after the first request.
+        """
+        descriptor = StreamCache.get(track_id)
+        if descriptor:
+            return descriptor
+
         try:
-            path = await self.repo.get_path_by_track_id(track_id)
-            track_info = await self.repo.get_track(track_id)
+            track_info = await self.repo.get_stream(track_id)
+            path = get_path(track_info['filepath'])
+            stat_result = await aiofiles.os.stat(path)
         except:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-        track_mime = track_info['content_type']
-        track_size = track_info['filesize']
+        descriptor = {
+            'path': path,
+            'size': stat_result.st_size,
+            'mime': track_info['content_type'],
+            'mtime_ns': stat_result.st_mtime_ns,
+            'title': track_info['title'],
+        }
+        StreamCache.put(track_id, descriptor)
+
+        return descriptor
+
+
+    async def streaming(self, track_id: str, range: str) -> tuple[bytes, dict[str, Any]]:
+        track_info = await self.get_stream(track_id)
+
+        track_mime = track_info['mime']
+        track_size = track_info['size']
         track_chunk = int(track_size * 0.25)
-        real_path = get_path(path)
+        real_path = track_info['path']
 
         if range:
             track_range = range.replace("bytes=", "").split("-")
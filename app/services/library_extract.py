@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from core.config import Config
+from core.logging import logs
+from tools.tags_handler import extract_tags_batch
+
+
+class LibraryExtract:
+    """
+    Long-lived process pool that reads tags for the scanner, the tracker and rescans.
+
+    Paths are sent to the workers in chunks of `Config.EXTRACTCHUNKSIZE`,
+    so TinyTag parsing runs on every core instead of serializing on the GIL.
+    """
+    pool: ProcessPoolExecutor | None = None
+    queued = 0
+    processed = 0
+    failed = 0
+    busy_time = 0.0
+    busy_since = 0.0
+
+
+    @classmethod
+    def start(cls) -> None:
+        if cls.pool is not None:
+            return
+
+        cls.pool = ProcessPoolExecutor(
+            max_workers=Config.EXTRACTWORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=signal.signal,
+            initargs=(signal.SIGINT, signal.SIG_IGN),
+        )
+        logs.debug("Tag extraction started with %d workers.", Config.EXTRACTWORKERS)
+
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls.pool is None:
+            return
+
+        cls.pool.shutdown(wait=True, cancel_futures=True)
+        cls.pool = None
+
+
+    @classmethod
+    async def extract(cls, paths: list[str]) -> list[tuple[str, dict[str, Any], dict[str, Any] | None]]:
+        """
+        Extracts `(filepath, tags, manifest)` for one chunk of paths, see `extract_tags_batch`.
+        """
+        cls.start()
+        loop = asyncio.get_running_loop()
+
+        if not cls.queued:
+            cls.busy_since = time.monotonic()
+        cls.queued += len(paths)
+
+        try:
+            tags_list = await loop.run_in_executor(cls.pool, extract_tags_batch, paths)
+        finally:
+            cls.queued -= len(paths)
+            if not cls.queued:
+                cls.busy_time += time.monotonic() - cls.busy_since
+
+        cls.processed += len(tags_list)
+        cls.failed += sum(1 for _, tags, _ in tags_list if not tags)
+        return tags_list
+
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        busy_time = cls.busy_time
+        if cls.queued:
+            busy_time += time.monotonic() - cls.busy_since
+
+        return {
+            'workers': Config.EXTRACTWORKERS if cls.pool else 0,
+            'queued': cls.queued,
+            'processed': cls.processed,
+            'failed': cls.failed,
+            'throughput': cls.processed / busy_time if busy_time else 0.0,
+        }
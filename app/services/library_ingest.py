@@ -0,0 +1,246 @@
+import asyncio
+from typing import Any
+from core.config import Config
+from core.database import db_conn
+from core.logging import logs
+from repos.library import LibraryRepo
+from services.library_status import LibraryStatus
+from services.stream_cache import StreamCache
+from tools.convert_value import hash_str
+from tools.path_handler import get_path, str_path
+from tools.tags_handler import get_album_id
+
+
+class LibraryIngest:
+    """
+    Collects extracted tracks and removed files, and writes them to the database in batches.
+
+    Every flush is one transaction: moved files are repointed in place, removed files
+    are deleted, then tracks and their manifest rows are bulk upserted. A batch is flushed when it reaches `batch_size`
+    files, or every `flush_interval` seconds while the ingest is open.
+
+    The album and album artist ids of every track written or removed, before and after
+    the change, are collected in `album_ids` and `artist_ids` for `LibraryScan.perform_all`.
+    """
+    def __init__(
+        self,
+        batch_size: int = Config.SCANBATCHSIZE,
+        flush_interval: float = Config.SCANFLUSHINTERVAL,
+    ) -> None:
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.tracks: dict[str, dict[str, Any]] = {}
+        self.manifest: dict[str, dict[str, Any]] = {}
+        self.removed: set[str] = set()
+        self.moves: dict[str, tuple[str, dict[str, Any]]] = {}
+        self.lock = asyncio.Lock()
+        self.timer: asyncio.Task | None = None
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.moved = 0
+        self.album_ids: set[str] = set()
+        self.artist_ids: set[str] = set()
+
+
+    async def __aenter__(self) -> 'LibraryIngest':
+        self.timer = asyncio.create_task(self.flush_timer())
+        LibraryStatus.ingests.add(self)
+        return self
+
+
+    async def __aexit__(self, *args) -> None:
+        if self.timer:
+            self.timer.cancel()
+            await asyncio.gather(self.timer, return_exceptions=True)
+
+        try:
+            await self.flush()
+        finally:
+            LibraryStatus.ingests.discard(self)
+
+
+    @property
+    def pending(self) -> int:
+        return len(self.manifest) + len(self.removed) + len(self.moves)
+
+
+    async def put(
+        self,
+        filepath: str,
+        tags: dict[str, Any],
+        manifest: dict[str, Any] | None,
+    ) -> None:
+        """
+        Queues the result of `extract_tags_batch` for one file.
+
+        A file that couldn't be parsed keeps its manifest row, so it isn't read again
+        until it changes, but any track previously stored for it is removed.
+        """
+        if not manifest:
+            return await self.remove(filepath)
+
+        self.removed.discard(filepath)
+        self.moves.pop(filepath, None)
+        self.manifest[filepath] = manifest
+
+        if tags:
+            self.tracks[filepath] = tags
+        else:
+            self.tracks.pop(filepath, None)
+
+        await self.flush_full()
+
+
+    async def remove(self, filepath: str) -> None:
+        self.tracks.pop(filepath, None)
+        self.manifest.pop(filepath, None)
+        self.moves.pop(filepath, None)
+        self.removed.add(filepath)
+
+        await self.flush_full()
+
+
+    async def move(self, old_filepath: str, manifest: dict[str, Any]) -> None:
+        """
+        Queues a file that was moved unchanged to `manifest['filepath']`. Its track keeps
+        its tags, only the path, track id and album id are rewritten.
+        """
+        filepath = manifest['filepath']
+        self.tracks.pop(filepath, None)
+        self.manifest.pop(filepath, None)
+        self.removed.discard(filepath)
+        self.moves[filepath] = (old_filepath, manifest)
+
+        await self.flush_full()
+
+
+    async def flush_full(self) -> None:
+        if self.pending >= self.batch_size:
+            await self.flush()
+
+
+    async def flush(self) -> tuple[int, int]:
+        async with self.lock:
+            if not self.manifest and not self.removed and not self.moves:
+                return 0, 0
+
+            tracks, self.tracks = self.tracks, {}
+            manifest, self.manifest = self.manifest, {}
+            removed, self.removed = self.removed, set()
+            moves, self.moves = self.moves, {}
+            inserted, updated, moved = 0, 0, 0
+
+            try:
+                async with db_conn() as conn:
+                    repo = LibraryRepo(conn)
+                    failed = [path for path in manifest if path not in tracks]
+
+                    old_paths = {old_filepath: filepath for filepath, (old_filepath, _) in moves.items()}
+                    track_ids = [hash_str(path) for path in [*removed, *manifest, *moves, *old_paths]]
+                    groups = await repo.get_track_groups(track_ids)
+                    groups += [(tags['album_id'], tags['albumartist_id']) for tags in tracks.values()]
+                    for album_id, albumartist_id in groups:
+                        self.album_ids.add(album_id)
+                        self.artist_ids.add(albumartist_id)
+
+                    # Moved files get manifest rows at their new path, `manifest` itself is left
+                    # as queued so a failed flush can put it back.
+                    manifest_rows = [*manifest.values(), *(data for _, data in moves.values())]
+
+                    if moves:
+                        moved = await self.flush_moves(repo, old_paths)
+                        await repo.delete_manifest(list(old_paths))
+
+                    if removed or failed:
+                        await repo.delete_tracks([*removed, *failed])
+                    if removed:
+                        await repo.delete_manifest(list(removed))
+                    if tracks:
+                        inserted, updated = await repo.upsert_tracks(list(tracks.values()))
+                    if manifest_rows:
+                        await repo.upsert_manifest(manifest_rows)
+            except BaseException:
+                # The writer timed out or the commit failed, keep the batch for the next flush.
+                self.requeue(tracks, manifest, removed, moves)
+                raise
+
+            StreamCache.invalidate(track_ids)
+            self.inserted += inserted
+            self.updated += updated
+            self.deleted += len(removed)
+            self.moved += moved
+            LibraryStatus.written += inserted + updated + moved + len(removed)
+            logs.debug(
+                "Tracks written: %d inserted, %d updated, %d moved, %d removed",
+                inserted, updated, moved, len(removed),
+            )
+
+            return inserted, updated
+
+
+    def requeue(
+        self,
+        tracks: dict[str, dict[str, Any]],
+        manifest: dict[str, dict[str, Any]],
+        removed: set[str],
+        moves: dict[str, tuple[str, dict[str, Any]]],
+    ) -> None:
+        """
+        Puts back the buffers of a failed flush, files queued again since then keep their newer entry.
+        """
+        queued = self.manifest.keys() | self.removed | self.moves.keys()
+
+        for filepath, data in manifest.items():
+            if filepath not in queued:
+                self.manifest[filepath] = data
+                if filepath in tracks:
+                    self.tracks[filepath] = tracks[filepath]
+
+        self.removed |= removed - queued
+        self.moves.update({filepath: move for filepath, move in moves.items() if filepath not in queued})
+
+
+    async def flush_moves(self, repo: LibraryRepo, old_paths: dict[str, str]) -> int:
+        rows = await repo.get_tracks_by_paths(list(old_paths))
+        move_list = []
+
+        for row in rows:
+            filepath = old_paths[row.filepath]
+            directory = str_path(get_path(filepath).parent)
+            album_id = get_album_id(
+                row.album,
+                row.albumartist,
+                row.artist,
+                row.disc_total,
+                row.track_total,
+                directory,
+            )
+            self.album_ids.add(album_id)
+
+            move_list.append({
+                'old_track_id': row.track_id,
+                'new_track_id': hash_str(filepath),
+                'new_album_id': album_id,
+                'new_directory': directory,
+                'new_filepath': filepath,
+            })
+
+        # A file moved over an existing one replaces its track.
+        await repo.delete_tracks(list(old_paths.values()))
+        if move_list:
+            await repo.move_tracks(move_list)
+
+        return len(move_list)
+
+
+    async def flush_timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except Exception as error:
+                # The batch is kept, a writer timeout isn't logged anywhere else.
+                logs.warning("Tracks not written, retrying with the next flush: %s", error or type(error).__name__)
@@ -0,0 +1,44 @@
+from typing import Any
+from tools.tags_handler import TAG_VERSION
+
+
+class LibraryMoves:
+    """
+    Pairs files that disappeared in a watcher batch with files that appeared in it.
+
+    A file keeps its inode, size and mtime when it is renamed or moved within a filesystem,
+    so a new file with the fingerprint of a removed one is the same file under a new path.
+    Moves across filesystems get a new inode, those are matched on size and mtime alone
+    when no other removed file shares them.
+    """
+    def __init__(self, rows: list[Any]) -> None:
+        self.by_inode: dict[tuple[int, int, int], Any] = {}
+        self.by_stat: dict[tuple[int, int], list[Any]] = {}
+        self.matched: set[str] = set()
+
+        for row in rows:
+            # Rows without a real fingerprint or with stale tags are read again instead.
+            if not row.inode or row.tag_version != TAG_VERSION:
+                continue
+
+            self.by_inode[(row.inode, row.filesize, row.mtime_ns)] = row
+            self.by_stat.setdefault((row.filesize, row.mtime_ns), []).append(row)
+
+
+    def match(self, fingerprint: dict[str, Any]) -> str | None:
+        """
+        Returns the removed path the fingerprinted file was moved from, if any.
+        """
+        row = self.by_inode.get((fingerprint['inode'], fingerprint['filesize'], fingerprint['mtime_ns']))
+
+        if row is None:
+            rows = self.by_stat.get((fingerprint['filesize'], fingerprint['mtime_ns']), [])
+            if len(rows) != 1:
+                return None
+            row = rows[0]
+
+        if row.filepath in self.matched:
+            return None
+
+        self.matched.add(row.filepath)
+        return row.filepath
@@ -0,0 +1,225 @@
+import asyncio
+import os
+import time
+from itertools import count
+from typing import Any, AsyncIterator
+from core.config import Config
+from core.database import db_read
+from core.logging import logs
+from repos.library import LibraryRepo
+from services.library_extract import LibraryExtract
+from services.library_ingest import LibraryIngest
+from services.library_scan import LibraryScan
+from services.library_status import LibraryStatus
+from services.library_walk import LibraryWalk
+from tools.path_handler import get_path, get_fingerprint
+from tools.tags_handler import is_unchanged
+
+
+class LibraryPipeline:
+    """
+    Staged scan pipeline: files are filtered against the manifest, extracted by the
+    process pool and written through the ingest, with bounded queues between stages.
+
+    Each queue holds at most `queue_size` chunks, so a slow stage pauses the ones before
+    it, all the way back to the walk, and memory stays flat however large the library is.
+
+    Extraction is ordered by priority. Directories promoted by a request come first and
+    are written as soon as they are read, files modified in the last `Config.SCANRECENT`
+    seconds come next, and the rest of the backlog follows in walk order.
+    """
+    PROMOTED = 0
+    RECENT = 1
+    BACKLOG = 2
+    DONE = 3
+
+    def __init__(
+        self,
+        ingest: LibraryIngest,
+        queue_size: int = Config.PIPELINEQUEUESIZE,
+    ) -> None:
+
+        self.ingest = ingest
+        self.workers = Config.EXTRACTWORKERS
+        self.chunk_size = Config.EXTRACTCHUNKSIZE
+        self.filter_size = Config.EXTRACTCHUNKSIZE * Config.EXTRACTWORKERS
+        self.filter_queue: asyncio.Queue[list[tuple[str, os.stat_result]] | None] = asyncio.Queue(queue_size)
+        self.extract_queue: asyncio.PriorityQueue[tuple[int, int, list[str] | None]] = asyncio.PriorityQueue(queue_size)
+        self.write_queue: asyncio.Queue[tuple[int, list[Any]] | None] = asyncio.Queue(queue_size)
+        self.sequence = count()
+        self.promoted: set[str] = set()
+        self.promotions: set[asyncio.Task] = set()
+        self.closed = False
+        self.filtering = 0
+        self.extracting = 0
+        self.writing = 0
+
+
+    @classmethod
+    def promote_directory(cls, directory: str) -> bool:
+        """
+        Moves the files of `directory` ahead of the backlog of a running scan.
+
+        Returns False if no scan is running, in which case the directory is either
+        indexed already or will be picked up by the tracker.
+        """
+        for pipeline in LibraryStatus.pipelines:
+            if isinstance(pipeline, cls) and not pipeline.closed:
+                if directory not in pipeline.promoted:
+                    pipeline.promoted.add(directory)
+                    task = asyncio.create_task(pipeline.promote(directory))
+                    pipeline.promotions.add(task)
+                    task.add_done_callback(pipeline.promotions.discard)
+                return True
+
+        return False
+
+
+    async def run(self, files: AsyncIterator[tuple[str, os.stat_result]]) -> None:
+        """
+        Pushes `(filepath, stat_result)` pairs through every stage and returns once they are all queued in the ingest.
+        """
+        tasks = [
+            asyncio.create_task(self.feed(files)),
+            asyncio.create_task(self.filter_stage()),
+            *[asyncio.create_task(self.extract_stage()) for _ in range(self.workers)],
+            asyncio.create_task(self.write_stage()),
+        ]
+        LibraryStatus.pipelines.add(self)
+
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            LibraryStatus.pipelines.discard(self)
+            self.closed = True
+            for task in [*tasks, *self.promotions]:
+                task.cancel()
+            await asyncio.gather(*tasks, *self.promotions, return_exceptions=True)
+
+
+    async def feed(self, files: AsyncIterator[tuple[str, os.stat_result]]) -> None:
+        chunk = []
+
+        async for file in files:
+            chunk.append(file)
+            if len(chunk) >= self.filter_size:
+                await self.filter_queue.put(chunk)
+                self.filtering += len(chunk)
+                chunk = []
+
+        if chunk:
+            await self.filter_queue.put(chunk)
+            self.filtering += len(chunk)
+        await self.filter_queue.put(None)
+
+
+    async def filter_changed(self, files: list[tuple[str, os.stat_result]]) -> list[tuple[str, os.stat_result]]:
+        """
+        Drops files whose fingerprint still matches the manifest.
+        """
+        async with db_read() as conn:
+            repo = LibraryRepo(conn)
+            manifest = await repo.get_manifest_by_paths([path for path, _ in files])
+
+        return [
+            (path, stat_result) for path, stat_result in files
+            if path not in manifest or not is_unchanged(manifest[path], get_fingerprint(path, stat_result))
+        ]
+
+
+    async def filter_stage(self) -> None:
+        """
+        Filters each chunk and regroups the changed files into extraction chunks by priority.
+        """
+        chunks: dict[int, list[str]] = {self.RECENT: [], self.BACKLOG: []}
+
+        while (files := await self.filter_queue.get()) is not None:
+            changed = await self.filter_changed(files)
+            self.filtering -= len(files)
+            recent = time.time() - Config.SCANRECENT
+
+            for path, stat_result in changed:
+                priority = self.RECENT if stat_result.st_mtime >= recent else self.BACKLOG
+                chunks[priority].append(path)
+
+                if len(chunks[priority]) >= self.chunk_size:
+                    await self.put_extract(chunks[priority], priority)
+                    chunks[priority] = []
+
+        for priority, paths in chunks.items():
+            if paths:
+                await self.put_extract(paths, priority)
+
+        self.closed = True
+        for _ in range(self.workers):
+            await self.extract_queue.put((self.DONE, next(self.sequence), None))
+
+
+    async def promote(self, directory: str) -> None:
+        """
+        Lists `directory` and its subdirectories, up to `Config.PROMOTELIMIT` files, and queues
+        every changed file at the front of the extraction queue.
+        """
+        loop = asyncio.get_running_loop()
+        walk = LibraryWalk(get_path(directory))
+        dirs, files = [str(walk.root)], []
+
+        while dirs and len(files) < Config.PROMOTELIMIT:
+            subdirs, found, _ = await loop.run_in_executor(None, walk.scan_dir, dirs.pop())
+            dirs.extend(subdirs)
+            files.extend(found)
+
+        changed = await self.filter_changed(files[:Config.PROMOTELIMIT])
+        for i in range(0, len(changed), self.chunk_size):
+            if self.closed:
+                return
+            await self.put_extract([path for path, _ in changed[i:i + self.chunk_size]], self.PROMOTED)
+
+        logs.debug("Promoted %d files in %s", len(changed), directory)
+
+
+    async def put_extract(self, paths: list[str], priority: int) -> None:
+        await self.extract_queue.put((priority, next(self.sequence), paths))
+        self.extracting += len(paths)
+        LibraryStatus.queued += len(paths)
+
+
+    async def extract_stage(self) -> None:
+        while (item := await self.extract_queue.get())[2] is not None:
+            priority, _, paths = item
+            self.extracting -= len(paths)
+            tags_list = await LibraryExtract.extract(paths)
+
+            await self.write_queue.put((priority, tags_list))
+            self.writing += len(tags_list)
+
+        await self.write_queue.put(None)
+
+
+    async def write_stage(self) -> None:
+        finished = 0
+
+        while finished < self.workers:
+            item = await self.write_queue.get()
+            if item is None:
+                finished += 1
+                continue
+
+            priority, tags_list = item
+            self.writing -= len(tags_list)
+            for filepath, tags, manifest in tags_list:
+                LibraryStatus.processed += 1
+                LibraryStatus.failed += not tags
+                await self.ingest.put(filepath, tags, manifest)
+
+            if priority == self.PROMOTED:
+                # Promoted directories are shown as soon as they are read, not after the whole scan.
+                await self.ingest.flush()
+                tracks = [tags for _, tags, _ in tags_list if tags]
+                if tracks:
+                    LibraryScan.schedule(
+                        {tags['album_id'] for tags in tracks},
+                        {tags['albumartist_id'] for tags in tracks},
+                    )
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any
+from core.config import Config
+from tools.path_handler import Path, get_path, str_path
+
+
+class LibraryRoot:
+    """
+    One library directory, `Config.LIBRARYDIR` or an entry of `Config.LIBRARYDIRS`, and its scan state.
+
+    Every root is walked by its own `LibraryWalk` and watched by its own watcher, so a slow
+    or unmounted disk only holds up its own files. Tracks of a root that is offline are
+    kept until it comes back. A root on another disk is best pointed at a directory inside
+    it, which is missing rather than empty while the disk is unmounted.
+    """
+    roots: list['LibraryRoot'] = []
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.prefix = f'{str_path(path)}/'
+        self.online = False
+        self.mounted = False
+        self.scanning = False
+        self.watching = False
+        self.discovered = 0
+        self.scanned_at: datetime | None = None
+        self.scan_duration: float | None = None
+        self.error: str | None = None
+        self.started = 0.0
+
+
+    @classmethod
+    def load(cls) -> list['LibraryRoot']:
+        if not cls.roots:
+            paths = {str_path(get_path(path)): get_path(path) for path in [Config.LIBRARYDIR, *Config.LIBRARYDIRS]}
+            cls.roots = [cls(path) for path in paths.values()]
+
+        return cls.roots
+
+
+    @classmethod
+    def find(cls, filepath: str) -> 'LibraryRoot | None':
+        for root in cls.load():
+            if f'{filepath}/'.startswith(root.prefix):
+                return root
+
+        return None
+
+
+    async def check(self) -> bool:
+        """
+        Checks that the root can be listed within `Config.ROOTTIMEOUT` seconds.
+
+        An empty root is a library with no files, unless it was a mount point when last
+        online: an unmounted disk leaves an empty mount point behind, which counts as offline.
+        """
+        loop = asyncio.get_running_loop()
+
+        try:
+            empty, mounted = await asyncio.wait_for(
+                loop.run_in_executor(None, self.list_root),
+                Config.ROOTTIMEOUT,
+            )
+            self.online = not (empty and self.mounted and not mounted)
+            self.error = None if self.online else 'Library disk is unmounted'
+            if self.online:
+                self.mounted = mounted
+        except asyncio.TimeoutError:
+            self.online, self.error = False, 'Library timed out'
+        except OSError as error:
+            self.online, self.error = False, str(error)
+
+        return self.online
+
+
+    def list_root(self) -> tuple[bool, bool]:
+        with os.scandir(self.path) as entries:
+            empty = next(entries, None) is None
+
+        return empty, os.path.ismount(self.path)
+
+
+    def start_scan(self) -> None:
+        self.scanning = True
+        self.discovered = 0
+        self.started = time.monotonic()
+
+
+    def finish_scan(self) -> None:
+        self.scanning = False
+        self.scanned_at = datetime.now(timezone.utc)
+        self.scan_duration = time.monotonic() - self.started
+
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'path': str_path(self.path),
+            'online': self.online,
+            'scanning': self.scanning,
+            'watching': self.watching,
+            'discovered': self.discovered,
+            'scanned_at': self.scanned_at,
+            'scan_duration': self.scan_duration,
+            'error': self.error,
+        }
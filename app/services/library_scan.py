@@ -1,158 +1,203 @@
 import asyncio
-from models import Album, Artist, Track
-from core.database import db_conn, select, func, exists
+import time
+from typing import Any, Iterator
+from models import Track
+from core.config import Config
+from core.database import db_conn, select, func, aliased
 from core.logging import logs
 from repos.library import LibraryRepo
 
 
 class LibraryScan:
+    chunk_size = 500
+    task: asyncio.Task | None = None
+    running = False
+    pending = False
+    pending_all = False
+    pending_albums: set[str] = set()
+    pending_artists: set[str] = set()
+    first_request = 0.0
+    last_request = 0.0
+    coalesced = 0
+    last_duration = 0.0
+
+
+    @classmethod
+    def schedule(
+        cls,
+        album_ids: set[str] | None = None,
+        artist_ids: set[str] | None = None,
+    ) -> None:
+        """
+        Requests an aggregation pass, see `perform_all`.
+
+        At most one pass runs at a time. Requests that arrive while a pass is waiting
+        or running are merged into a single follow-up pass, which starts once no request
+        has arrived for `Config.AGGREGATEDELAY` seconds, or `Config.AGGREGATEMAXDELAY`
+        seconds after the first merged request.
+        """
+        now = time.monotonic()
+
+        if cls.pending:
+            cls.coalesced += 1
+        else:
+            cls.pending = True
+            cls.first_request = now
+
+        cls.last_request = now
+        if album_ids is None and artist_ids is None:
+            cls.pending_all = True
+        else:
+            cls.pending_albums |= album_ids or set()
+            cls.pending_artists |= artist_ids or set()
+
+        if cls.task is None or cls.task.done():
+            cls.task = asyncio.create_task(cls.run_pending())
+
+
+    @classmethod
+    async def run_pending(cls) -> None:
+        while cls.pending:
+            while True:
+                now = time.monotonic()
+                delay = min(
+                    cls.last_request + Config.AGGREGATEDELAY,
+                    cls.first_request + Config.AGGREGATEMAXDELAY,
+                ) - now
+
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+
+            full = cls.pending_all
+            album_ids, artist_ids = cls.pending_albums, cls.pending_artists
+            cls.pending, cls.pending_all = False, False
+            cls.pending_albums, cls.pending_artists = set(), set()
+
+            started, cls.running = time.monotonic(), True
+            try:
+                await cls.perform_all(
+                    None if full else album_ids,
+                    None if full else artist_ids,
+                )
+            finally:
+                cls.running = False
+                cls.last_duration = time.monotonic() - started
+
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        return {
+            'running': cls.running,
+            'pending': cls.pending,
+            'coalesced': cls.coalesced,
+            'last_duration': cls.last_duration,
+        }
+
+
     @staticmethod
-    async def perform_all() -> None:
+    async def perform_all(
+        album_ids: set[str] | None = None,
+        artist_ids: set[str] | None = None,
+    ) -> None:
+        """
+        Recomputes album and artist aggregates from the tracks table.
+
+        If ids are given, only those albums and album artists are recomputed or removed;
+        otherwise the whole library is.
+        """
         await asyncio.gather(
-            LibraryScan.perform_albums(),
-            LibraryScan.perform_artists(),
+            LibraryScan.perform_albums(album_ids),
+            LibraryScan.perform_artists(artist_ids),
             return_exceptions=True,
         )
 
 
     @staticmethod
-    async def perform_albums() -> None:
-        async with db_conn() as conn:
-            db_query = (
-                select(
-                    Track.album,
-                    Track.album_id,
-                    Track.albumartist,
-                    Track.albumartist_id,
-                    Track.disc_total,
-                    Track.track_total,
-                    Track.year,
-                    func.sum(Track.duration).label('duration_total'),
-                    func.sum(Track.filesize).label('filesize_total'),
-                )
-                .where(
-                    Track.album_id != '',
-                )
-                .group_by(
-                    Track.album,
-                    Track.album_id,
-                    Track.albumartist,
-                    Track.track_total,
-                )
-            )
-
-            db_result = await conn.execute(db_query)
-            albums_data = db_result.all()
-
-            for alb in albums_data:
-                album_data = {
-                    'album': alb.album,
-                    'album_id': alb.album_id,
-                    'albumartist_id': alb.albumartist_id,
-                    'disc_total': alb.disc_total,
-                    'duration_total': alb.duration_total,
-                    'filesize_total': alb.filesize_total,
-                    'year': alb.year,
-                }
-
-                await LibraryRepo(conn).insert_album(album_data)
-
-            unknown_query = (
-                select(
-                    Track.album,
-                    Track.album_id,
-                    Track.artist,
-                    Track.disc_total,
-                    Track.track_total,
-                    Track.year,
-                    func.sum(Track.duration).label('duration_total'),
-                    func.sum(Track.filesize).label('filesize_total'),
-                )
-                .where(Track.album == '')
-                .group_by(
-                    Track.artist,
-                    Track.directory,
-                )
-            )
+    def chunk_ids(ids: set[str] | None) -> Iterator[list[str] | None]:
+        if ids is None:
+            yield None
+            return
 
-            unknown_result = await conn.execute(unknown_query)
-            unknown_albums_data = unknown_result.all()
+        ids = sorted(ids)
+        for i in range(0, len(ids), LibraryScan.chunk_size):
+            yield ids[i:i + LibraryScan.chunk_size]
 
-            for alb in unknown_albums_data:
-                album_data = {
-                    'album': alb.album,
-                    'album_id': alb.album_id,
-                    'albumartist_id': '',
-                    'disc_total': alb.disc_total,
-                    'duration_total': alb.duration_total,
-                    'filesize_total': alb.filesize_total,
-                    'year': alb.year,
-                }
-
-                await LibraryRepo(conn).insert_album(album_data)
 
+    @staticmethod
+    async def perform_albums(album_ids: set[str] | None = None) -> None:
         async with db_conn() as conn:
-            albums_query = select(Album.album_id)
-            result = await conn.execute(albums_query)
-            album_hash = {row.album_id for row in result}
+            repo = LibraryRepo(conn)
+
+            for ids in LibraryScan.chunk_ids(album_ids):
+                db_query = (
+                    select(
+                        func.max(Track.album).label('album'),
+                        Track.album_id,
+                        func.max(Track.albumartist_id).label('albumartist_id'),
+                        func.min(Track.filepath).label('artwork_path'),
+                        func.count(Track.track_id).label('track_total'),
+                        func.max(Track.disc_total).label('disc_total'),
+                        func.max(Track.year).label('year'),
+                        func.sum(Track.duration).label('duration_total'),
+                        func.sum(Track.filesize).label('filesize_total'),
+                    )
+                    .where(Track.album_id != '')
+                    .group_by(Track.album_id)
+                )
+                if ids is not None:
+                    db_query = db_query.where(Track.album_id.in_(ids))
+
+                # The name is read from a track of the chosen album artist, so it always
+                # belongs to `albumartist_id`. Ids fall back to the track artist, so does the name.
+                albums = db_query.subquery()
+                track = aliased(Track)
+                albumartist = (
+                    select(func.coalesce(func.nullif(track.albumartist, ''), track.artist))
+                    .where(track.album_id == albums.c.album_id, track.albumartist_id == albums.c.albumartist_id)
+                    .limit(1)
+                    .scalar_subquery()
+                )
 
-            tracks_query = select(Track.album_id).distinct()
-            result = await conn.execute(tracks_query)
-            track_hash = {row.album_id for row in result}
+                db_result = await conn.execute(
+                    select(albums, func.coalesce(albumartist, '').label('albumartist'))
+                )
+                albums_data = [dict(row) for row in db_result.mappings().all()]
 
-            orphan_albums = album_hash - track_hash
+                if albums_data:
+                    await repo.upsert_albums(albums_data)
+                await repo.delete_orphan_albums(ids)
+                await repo.replace_artist_albums(ids)
 
-            for album_id in orphan_albums:
-                logs.debug("Removing Album... (%s)", album_id)
-                await LibraryRepo(conn).delete_album(album_id)
+            logs.debug("Albums updated (%s)", 'all' if album_ids is None else len(album_ids))
 
 
     @staticmethod
-    async def perform_artists() -> None:
+    async def perform_artists(artist_ids: set[str] | None = None) -> None:
         async with db_conn() as conn:
-            db_query = (
-                select(
-                    Track.albumartist_id,
-                    Track.albumartist,
-                    func.count(Track.track_id).label('track_total'),
-                    func.count(func.distinct(Track.album_id)).label('album_total'),
-                    func.sum(Track.duration).label('duration_total'),
-                    func.sum(Track.filesize).label('filesize_total'),
-                )
-                .where(Track.albumartist != '')
-                .group_by(Track.albumartist_id, Track.albumartist)
-            )
-
-            db_result = await conn.execute(db_query)
-            artists_data = db_result.all()
-
-            for art in artists_data:
-                artist_data = {
-                    'artist': art.albumartist,
-                    'artist_id': art.albumartist_id,
-                    'album_total': art.album_total,
-                    'track_total': art.track_total,
-                    'duration_total': art.duration_total,
-                    'filesize_total': art.filesize_total,
-                }
-                
-                logs.debug(artist_data)
-                await LibraryRepo(conn).insert_artist(artist_data)
-
-        async with db_conn() as conn:
-            orphan_albumartists_query = (
-                select(Artist.artist_id)
-                .where(
-                    ~exists(
-                        select(1)
-                        .where(Track.albumartist_id == Artist.artist_id)
+            repo = LibraryRepo(conn)
+
+            for ids in LibraryScan.chunk_ids(artist_ids):
+                db_query = (
+                    select(
+                        func.max(Track.albumartist).label('artist'),
+                        Track.albumartist_id.label('artist_id'),
+                        func.count(func.distinct(Track.album_id)).label('album_total'),
+                        func.count(Track.track_id).label('track_total'),
+                        func.sum(Track.duration).label('duration_total'),
+                        func.sum(Track.filesize).label('filesize_total'),
                     )
+                    .where(Track.albumartist != '')
+                    .group_by(Track.albumartist_id)
                 )
-            )
+                if ids is not None:
+                    db_query = db_query.where(Track.albumartist_id.in_(ids))
+
+                db_result = await conn.execute(db_query)
+                artists_data = [dict(row) for row in db_result.mappings().all()]
 
-            result = await conn.execute(orphan_albumartists_query)
-            orphan_albumartists = {row[0] for row in result}
+                if artists_data:
+                    await repo.upsert_artists(artists_data)
+                await repo.delete_orphan_artists(ids)
 
-            for artist_id in orphan_albumartists:
-                logs.debug("Removing Artist... (%s)", artist_id)
-                await LibraryRepo(conn).delete_artist(artist_id)
+            logs.debug("Artists updated (%s)", 'all' if artist_ids is None else len(artist_ids))
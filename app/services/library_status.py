@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timezone
+from typing import Any
+from core.database import WriteQueue
+from models.scan import ScanPhaseEnum
+from services.library_extract import LibraryExtract
+from services.library_root import LibraryRoot
+from services.library_scan import LibraryScan
+
+
+class LibraryStatus:
+    """
+    Progress of the current or last library scan.
+
+    The scanner moves `phase` along and bumps plain counters, so updates cost no more
+    than an integer add. Walkers, pipelines and ingests register themselves while open,
+    and their queue depths are only read when the status is requested.
+    """
+    phase: ScanPhaseEnum | None = None
+    started_at: datetime | None = None
+    started = 0.0
+    finished = 0.0
+    discovered = 0
+    queued = 0
+    processed = 0
+    failed = 0
+    written = 0
+    walks: set[Any] = set()
+    pipelines: set[Any] = set()
+    ingests: set[Any] = set()
+
+
+    @classmethod
+    def start(cls) -> None:
+        cls.phase = ScanPhaseEnum.RECONCILING
+        cls.started_at = datetime.now(timezone.utc)
+        cls.started = time.monotonic()
+        cls.finished = 0.0
+        cls.discovered = cls.queued = cls.processed = cls.failed = cls.written = 0
+
+
+    @classmethod
+    def finish(cls) -> None:
+        cls.phase = None
+        cls.finished = time.monotonic()
+
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        if cls.phase:
+            phase = cls.phase
+        elif LibraryScan.running or LibraryScan.pending:
+            phase = ScanPhaseEnum.AGGREGATING
+        else:
+            phase = ScanPhaseEnum.IDLE
+
+        if cls.started:
+            elapsed = (cls.finished or time.monotonic()) - cls.started
+        else:
+            elapsed = 0.0
+
+        files_per_second = cls.processed / elapsed if elapsed else 0.0
+        remaining = cls.queued - cls.processed
+
+        return {
+            'phase': phase,
+            'started_at': cls.started_at,
+            'elapsed': elapsed,
+            'discovered': cls.discovered,
+            'processed': cls.processed,
+            'failed': cls.failed,
+            'written': cls.written,
+            'files_per_second': files_per_second,
+            'eta': remaining / files_per_second if cls.phase and files_per_second else None,
+            'queues': {
+                'walk': sum(walk.pending for walk in cls.walks),
+                'filter': sum(pipeline.filtering for pipeline in cls.pipelines),
+                'extract': sum(pipeline.extracting for pipeline in cls.pipelines) + LibraryExtract.queued,
+                'write': sum(pipeline.writing for pipeline in cls.pipelines)
+                    + sum(ingest.pending for ingest in cls.ingests),
+                'aggregate': len(LibraryScan.pending_albums) + len(LibraryScan.pending_artists) + LibraryScan.pending_all,
+            },
+            'writes': WriteQueue.stats(),
+            'extract': LibraryExtract.stats(),
+            'aggregation': LibraryScan.stats(),
+            'roots': [root.stats() for root in LibraryRoot.load()],
+        }
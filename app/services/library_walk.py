@@ -0,0 +1,129 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from core.config import Config
+from core.logging import logs
+from services.library_status import LibraryStatus
+from tools.path_handler import Path, str_path, is_supported_file, is_excluded_file
+
+
+class LibraryWalk:
+    """
+    Walks a library directory with `os.scandir` on a bounded pool of threads.
+
+    Directories are fanned out across `workers` threads, so the event loop never blocks on
+    slow mounts. Supported files are streamed to the caller as they are found, and the walk
+    pauses once `queue_size` directories of results are waiting to be consumed. Files in
+    `known` were already checked against the manifest by the caller and are only counted.
+    """
+    def __init__(
+        self,
+        root: Path,
+        workers: int = Config.WALKWORKERS,
+        queue_size: int = Config.WALKQUEUESIZE,
+        ignore: list[str] = Config.SCANIGNORE,
+        known: set[str] | None = None,
+    ) -> None:
+
+        self.root = root
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ignore = ignore
+        self.known = known or set()
+        self.skipped = 0
+        self.visited: set[tuple[int, int]] = set()
+        self.pending = 0
+
+
+    def scan_dir(self, path: str) -> tuple[list[str], list[tuple[str, os.stat_result]], int]:
+        """
+        Lists one directory. `DirEntry` type information avoids a stat call per entry,
+        only new supported files and symlinked directories are stat-ed. Returns the
+        subdirectories, the new files and the number of known files.
+        """
+        dirs, files, skipped = [], [], 0
+
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if is_excluded_file(entry.name, self.ignore):
+                        continue
+
+                    try:
+                        if entry.is_dir():
+                            if entry.is_symlink():
+                                # Symlinked directories can form cycles.
+                                stat_result = entry.stat()
+                                key = (stat_result.st_dev, stat_result.st_ino)
+                                if key in self.visited:
+                                    continue
+                                self.visited.add(key)
+
+                            dirs.append(entry.path)
+
+                        elif is_supported_file(entry.path):
+                            filepath = str_path(entry.path)
+                            if filepath in self.known:
+                                skipped += 1
+                            else:
+                                files.append((filepath, entry.stat()))
+
+                    except OSError:
+                        continue
+
+        except OSError as error:
+            logs.warning("Skipping directory %s, %s", path, error)
+
+        return dirs, files, skipped
+
+
+    async def walk(self) -> AsyncIterator[tuple[str, os.stat_result]]:
+        loop = asyncio.get_running_loop()
+        dir_queue: asyncio.Queue[str] = asyncio.Queue()
+        file_queue: asyncio.Queue[list[tuple[str, os.stat_result]] | None] = asyncio.Queue(self.queue_size)
+
+        async def worker() -> None:
+            while True:
+                path = await dir_queue.get()
+                try:
+                    dirs, files, skipped = await loop.run_in_executor(executor, self.scan_dir, path)
+                    self.skipped += skipped
+                    LibraryStatus.discovered += skipped
+                    for dir in dirs:
+                        dir_queue.put_nowait(dir)
+                    if files:
+                        await file_queue.put(files)
+                        self.pending += len(files)
+                finally:
+                    dir_queue.task_done()
+
+        async def supervisor() -> None:
+            await dir_queue.join()
+            await file_queue.put(None)
+
+        try:
+            root_stat = await loop.run_in_executor(None, os.stat, self.root)
+            self.visited.add((root_stat.st_dev, root_stat.st_ino))
+        except OSError as error:
+            logs.warning("Skipping library %s, %s", self.root, error)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            dir_queue.put_nowait(str(self.root))
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            tasks.append(asyncio.create_task(supervisor()))
+
+            LibraryStatus.walks.add(self)
+
+            try:
+                while (files := await file_queue.get()) is not None:
+                    self.pending -= len(files)
+                    LibraryStatus.discovered += len(files)
+                    for file in files:
+                        yield file
+            finally:
+                LibraryStatus.walks.discard(self)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
@@ -2,10 +2,11 @@ import uuid
 from datetime import datetime
 from typing import Any
 from fastapi import HTTPException, status
-from core.database import NoResultFound
+from core.database import db_conn, WriteQueue, NoResultFound
 from core.logging import logs
 from models.playlist import PlaylistModel, PlaylistCreateModel
 from repos.playlist import PlaylistRepo
+from tools.convert_value import page_after, page_cursor
 
 
 class PlaylistService:
@@ -13,11 +14,13 @@ class PlaylistService:
         self.repo = repo
 
     
-    async def get_playlists(self, user_id: str, start: int, end: int) -> dict[str, list[dict[str, Any]] | int]:
-        playlists, total = await self.repo.get_playlists(user_id, start, end)
+    async def get_playlists(self, user_id: str, start: int, end: int, cursor: str | None = None) -> dict[str, list[dict[str, Any]] | int | str | None]:
+        playlists, total = await self.repo.get_playlists(user_id, start, end, page_after(cursor))
+
         return {
             "playlists": playlists,
-            "total": total
+            "total": total,
+            "next_cursor": page_cursor(playlists, ('playlist_name', 'playlist_id'), start, end)
         }
 
     
@@ -36,8 +39,10 @@ class PlaylistService:
             "shared": data.shared,
         }
 
-        await self.repo.create_playlist(playlist_item)
+        async with db_conn(WriteQueue.INTERACTIVE) as conn:
+            await PlaylistRepo(conn).create_playlist(playlist_item)
 
 
     async def delete_playlist(self, playlist_id: str) -> None:
-        await self.repo.delete_playlist(playlist_id)
+        async with db_conn(WriteQueue.INTERACTIVE) as conn:
+            await PlaylistRepo(conn).delete_playlist(playlist_id)
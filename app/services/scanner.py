@@ -1,94 +1,375 @@
 import asyncio
-import aiofiles.os
+import os
+from stat import S_ISDIR
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any, AsyncIterator
 from watchfiles import Change, awatch
 from core.config import Config
-from core.database import db_conn
+from core.database import db_conn, db_read
 from core.logging import logs
+from models.scan import ScanPhaseEnum
 from repos.library import LibraryRepo
+from services.library_ingest import LibraryIngest
+from services.library_moves import LibraryMoves
+from services.library_pipeline import LibraryPipeline
+from services.library_root import LibraryRoot
 from services.library_scan import LibraryScan
-from services.library_task import LibraryTask
-from tools.path_handler import Path, get_path, str_path, is_supported_file
+from services.library_status import LibraryStatus
+from services.library_walk import LibraryWalk
+from tools.path_handler import (
+    Path,
+    get_path,
+    str_path,
+    is_supported_file,
+    is_excluded_file,
+    get_fingerprint,
+)
+from tools.tags_handler import TAG_VERSION, is_unchanged
 
 
-async def scanner() -> None:
+async def scanner(roots: list[LibraryRoot] | None = None) -> None:
     """
-    It retrieves all track information from the database and checks if the files actually exist with matching sizes.
+    It streams the file manifest from the database and checks that each file still exists with a matching fingerprint.
 
-    If a file doesn't exist or the size differs, it is removed from the database; otherwise, it is excluded from the library scan.
+    Missing files are removed from the database and changed files are read again. The library scan then
+    picks up new files, skipping any whose size, mtime, inode and tag version still match the manifest.
+    Files the reconcile pass already stat-ed are skipped by the walk, so each file is stat-ed once.
+    Every library root is scanned unless `roots` is given, and roots that are offline are skipped
+    without removing their tracks.
     """
-    path_props, tasks = {}, []
-    
-    async with db_conn() as conn:
-        repo = LibraryRepo(conn)
-        track_info = await repo.get_scan_info()
+    LibraryStatus.start()
+    known: set[str] = set()
 
-    if track_info:
-        for path_data, size_data in track_info:
-            real_path = get_path(path_data)
+    try:
+        async with db_conn() as conn:
+            repo = LibraryRepo(conn)
+            await repo.backfill_manifest()
 
-            if not await aiofiles.os.path.exists(real_path):
-                tasks.append(LibraryTask(path_data).remove_track())
-            else:
-                stat_result = await aiofiles.os.stat(real_path)
-                if stat_result.st_size != size_data:
-                    tasks.append(LibraryTask(path_data).remove_track())
-                else:
-                    path_props[path_data] = 'p'
+        await asyncio.gather(*[root.check() for root in roots or LibraryRoot.load()])
+
+        async with LibraryIngest() as ingest:
+            await LibraryPipeline(ingest).run(reconcile_changes(ingest, roots, known))
+
+        await library_scanner([root for root in roots or LibraryRoot.load() if root.online], known)
 
-        if tasks:
-            await asyncio.gather(*tasks)
+    finally:
+        LibraryStatus.finish()
 
-    await library_scanner(props=path_props)
-    asyncio.create_task(LibraryScan.perform_all())
+    LibraryScan.schedule()
 
 
-async def library_scanner(props: dict, path=None) -> None:
-    if path is None:
-        path = Path(Config.LIBRARYDIR)
+async def reconcile(
+    root: LibraryRoot | None = None,
+    known: set[str] | None = None,
+) -> AsyncIterator[tuple[str, str, os.stat_result | None]]:
+    """
+    Pages through the manifest `Config.RECONCILECHUNKSIZE` rows at a time and stats each page in parallel,
+    limited to the files of `root` if given.
+
+    Yields `('delete', filepath, None)` for files that are gone and `('rescan', filepath, stat_result)`
+    for files whose fingerprint changed. Files of offline roots are left alone. Files that still
+    exist are added to `known`.
+    """
+    loop = asyncio.get_running_loop()
+    # '0' sorts right after '/', so the range covers exactly the files of the root.
+    after, before = (root.prefix, f'{root.prefix[:-1]}0') if root else ('', None)
 
-    queue, tasks = [path], []
+    with ThreadPoolExecutor(max_workers=Config.WALKWORKERS) as executor:
+        while True:
+            async with db_read() as conn:
+                repo = LibraryRepo(conn)
+                rows = await repo.get_manifest(after, Config.RECONCILECHUNKSIZE, before)
 
-    while queue:
-        current_path = queue.pop(0)
-        for path in current_path.iterdir():
-            path_value = str_path(path)
+            if not rows:
+                break
 
-            if path.is_dir():
-                props[path_value] = 'd'
-                queue.append(path)
+            after = rows[-1].filepath
+            size = -(-len(rows) // Config.WALKWORKERS)
+            stat_results = await asyncio.gather(*[
+                loop.run_in_executor(executor, stat_files, [row.filepath for row in rows[i:i + size]])
+                for i in range(0, len(rows), size)
+            ])
 
-            elif is_supported_file(path_value):
-                if props.get(path_value) == 'p':
-                    props.pop(path_value, None)
+            for row, stat_result in zip(rows, chain.from_iterable(stat_results)):
+                if stat_result is None:
+                    row_root = LibraryRoot.find(row.filepath)
+                    if row_root is None or row_root.online:
+                        yield 'delete', row.filepath, None
                 else:
-                    tasks.append(LibraryTask(path_value).create_track())
+                    if known is not None:
+                        known.add(row.filepath)
+                    if not is_unchanged(row, get_fingerprint(row.filepath, stat_result)):
+                        yield 'rescan', row.filepath, stat_result
+
+
+async def reconcile_changes(
+    ingest: LibraryIngest,
+    roots: list[LibraryRoot] | None = None,
+    known: set[str] | None = None,
+) -> AsyncIterator[tuple[str, os.stat_result]]:
+    for root in roots or [None]:
+        async for action, filepath, stat_result in reconcile(root, known):
+            if action == 'delete':
+                await ingest.remove(filepath)
+            else:
+                yield filepath, stat_result
+
+
+def stat_files(paths: list[str]) -> list[os.stat_result | None]:
+    stat_results = []
+
+    for path in paths:
+        try:
+            stat_results.append(get_path(path).stat())
+        except OSError:
+            stat_results.append(None)
+
+    return stat_results
 
-    if tasks:
-        await asyncio.gather(*tasks)
+
+async def library_scanner(roots: list[LibraryRoot] | None = None, known: set[str] | None = None) -> None:
+    if roots is None:
+        roots = [root for root in LibraryRoot.load() if await root.check()]
+
+    async with LibraryIngest() as ingest:
+        LibraryStatus.phase = ScanPhaseEnum.WALKING
+        await LibraryPipeline(ingest).run(walk_library(roots, known))
+        LibraryStatus.phase = ScanPhaseEnum.WRITING
+
+    logs.info("Library scan written: %d inserted, %d updated", ingest.inserted, ingest.updated)
+
+
+async def walk_library(
+    roots: list[LibraryRoot],
+    known: set[str] | None = None,
+) -> AsyncIterator[tuple[str, os.stat_result]]:
+    """
+    Walks every root at once and merges their files into one stream, leaving out `known` files.
+    Each root is pumped by its own task, so a slow root only delays its own files.
+    """
+    queue: asyncio.Queue[tuple[str, os.stat_result] | None] = asyncio.Queue(Config.WALKQUEUESIZE)
+
+    async def walk_root(root: LibraryRoot) -> None:
+        root.start_scan()
+        walk = LibraryWalk(root.path, known=known)
+        try:
+            async for file in walk.walk():
+                root.discovered += 1
+                await queue.put(file)
+        except Exception as error:
+            root.error = str(error)
+            logs.error("Failed to walk library %s, %s", root.path, error)
+        finally:
+            root.discovered += walk.skipped
+            root.finish_scan()
+            await queue.put(None)
+
+    tasks = [asyncio.create_task(walk_root(root)) for root in roots]
+    remaining = len(tasks)
+
+    try:
+        while remaining:
+            if (file := await queue.get()) is None:
+                remaining -= 1
+            else:
+                yield file
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    LibraryStatus.phase = ScanPhaseEnum.EXTRACTING
 
 
 async def tracker() -> None:
+    """
+    Watches every library root with its own watcher, see `watch_root`.
+    """
     logs.info("Started scanning for library.")
+    await asyncio.gather(*[watch_root(root) for root in LibraryRoot.load()])
+
+
+async def watch_root(root: LibraryRoot) -> None:
+    """
+    Watches a library root with kernel notifications, falling back to polling if they are unavailable
+    or if `Config.WATCHPOLLING` is set. Each debounced burst of events is written as one batch.
+
+    A root that is offline is checked again every `Config.ROOTRETRY` seconds and scanned once it returns.
+    """
+    force_polling = Config.WATCHPOLLING
+    missed = False
+
+    while True:
+        if not await root.check():
+            if not missed:
+                logs.warning("Library %s is offline, %s", root.path, root.error)
+            missed = True
+            await asyncio.sleep(Config.ROOTRETRY)
+            continue
+
+        if missed:
+            logs.info("Library %s is back online.", root.path)
+            missed = False
+            await scanner([root])
+
+        try:
+            root.watching = True
+            async for changes in awatch(
+                root.path,
+                recursive=True,
+                force_polling=force_polling,
+                debounce=Config.WATCHDEBOUNCE,
+                step=Config.WATCHSTEP,
+            ):
+                try:
+                    await track_changes(changes)
+                except Exception as error:
+                    logs.error("Failed to apply library changes, %s", error)
+
+        except (OSError, RuntimeError) as error:
+            if force_polling:
+                root.error = str(error)
+                logs.error("Failed to watch library %s, %s", root.path, error)
+                await asyncio.sleep(Config.ROOTRETRY)
+            else:
+                logs.warning("Native file watching is unavailable, falling back to polling. %s", error)
+                force_polling = True
+
+        finally:
+            root.watching = False
+
+
+async def track_changes(changes: set[tuple[Change, str]]) -> None:
+    """
+    Applies the net change set of one watcher burst through a single ingest.
+
+    Directories that appear are walked, since files copied in before the watch
+    was set up don't produce events. Directories that disappear take every
+    known file under them along. Files that reappear elsewhere in the same
+    burst are moved in place instead of being read again, see `LibraryMoves`.
+    """
+    net_changes = await coalesce_changes(changes)
+
+    async with LibraryIngest() as ingest:
+        await LibraryPipeline(ingest).run(apply_changes(net_changes, ingest))
+
+    if ingest.album_ids or ingest.artist_ids:
+        LibraryScan.schedule(ingest.album_ids, ingest.artist_ids)
+
+
+async def apply_changes(
+    net_changes: dict[str, tuple[Change, os.stat_result | None]],
+    ingest: LibraryIngest,
+) -> AsyncIterator[tuple[str, os.stat_result]]:
+    """
+    Yields every file that was added or modified and isn't a moved file, then removes
+    the deleted paths that weren't matched to a move.
+    """
+    removed = await get_removed_files(net_changes)
+    moves = LibraryMoves([row for row in removed.values() if row])
+    seen = set()
+
+    async for file, file_stat in changed_files(net_changes):
+        if file in seen:
+            continue
+        seen.add(file)
+
+        fingerprint = get_fingerprint(file, file_stat)
+        if (old_filepath := moves.match(fingerprint)):
+            fingerprint['tag_version'] = TAG_VERSION
+            await ingest.move(old_filepath, fingerprint)
+        else:
+            yield file, file_stat
+
+    for path in removed:
+        if path not in moves.matched:
+            await ingest.remove(path)
+
+
+async def changed_files(
+    net_changes: dict[str, tuple[Change, os.stat_result | None]],
+) -> AsyncIterator[tuple[str, os.stat_result]]:
+    for path, (change, stat_result) in net_changes.items():
+        if change == Change.deleted:
+            continue
+
+        if S_ISDIR(stat_result.st_mode):
+            if change == Change.added:
+                async for file in LibraryWalk(get_path(path)).walk():
+                    yield file
+
+        elif is_supported_file(path):
+            yield path, stat_result
+
+
+async def get_removed_files(
+    net_changes: dict[str, tuple[Change, os.stat_result | None]],
+) -> dict[str, Any]:
+    """
+    Returns the manifest rows of every deleted file, including the files under deleted directories.
+    Deleted files without a manifest row map to None.
+    """
+    paths = [path for path, (change, _) in net_changes.items() if change == Change.deleted]
+
+    # An unmounted disk looks like every file was deleted, its tracks are kept instead.
+    roots = {root for path in paths if (root := LibraryRoot.find(path))}
+    await asyncio.gather(*[root.check() for root in roots])
+    paths = [path for path in paths if (root := LibraryRoot.find(path)) is None or root.online]
+    files = [path for path in paths if is_supported_file(path)]
+    removed: dict[str, Any] = dict.fromkeys(files)
+
+    if not paths:
+        return removed
+
+    async with db_read() as conn:
+        repo = LibraryRepo(conn)
+        if files:
+            removed.update(await repo.get_manifest_by_paths(files))
+        for path in paths:
+            if path not in removed:
+                removed.update(await repo.get_manifest_under(path))
+
+    return removed
+
+
+async def coalesce_changes(
+    changes: set[tuple[Change, str]],
+) -> dict[str, tuple[Change, os.stat_result | None]]:
+    """
+    Collapses raw watcher events into one net change per path.
+
+    The burst is unordered, so the outcome is decided by whether the path still exists:
+    gone paths are deleted, new paths are added, and anything else, including a
+    delete followed by an add, is a single modification. Files that were created
+    and removed within the same burst are dropped.
+    """
+    events: dict[str, set[Change]] = {}
+
+    for change, path in changes:
+        path_value = str_path(path)
+        # Like the walk, only names below the root are matched, a root may sit in a hidden directory.
+        root = LibraryRoot.find(path_value)
+        relative = path_value[len(root.prefix):] if root else path_value
+        if any(is_excluded_file(part, Config.SCANIGNORE) for part in Path(relative).parts):
+            continue
+
+        events.setdefault(path_value, set()).add(change)
+
+    loop = asyncio.get_running_loop()
+    paths = list(events)
+    stat_results = await loop.run_in_executor(None, stat_files, paths)
+    net_changes = {}
+
+    for path, stat_result in zip(paths, stat_results):
+        kinds = events[path]
+
+        if stat_result is None:
+            if kinds != {Change.added}:
+                net_changes[path] = (Change.deleted, None)
+        elif kinds == {Change.added}:
+            net_changes[path] = (Change.added, stat_result)
+        else:
+            net_changes[path] = (Change.modified, stat_result)
 
-    async for event_handler in awatch(
-        Config.LIBRARYDIR,
-        recursive=True,
-        force_polling=True,
-    ):
-        tasks = []
-        
-        for event_type, event_path in event_handler:
-            str_path_val = str_path(event_path)
-
-            if is_supported_file(str_path_val):
-                instance = LibraryTask(str_path_val)
-
-                if event_type == Change.added:
-                    tasks.append(instance.create_track())
-                elif event_type == Change.deleted:
-                    tasks.append(instance.remove_track())
-                elif event_type == Change.modified:
-                    tasks.append(instance.update_track())
-
-        await asyncio.gather(*tasks)
-        asyncio.create_task(LibraryScan.perform_all())
+    return net_changes
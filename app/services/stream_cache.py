@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
+from core.config import Config
+
+
+class StreamCache:
+    """
+    Stream descriptors (path, size, mime, mtime) by track id, so Range requests after the
+    first one of a play don't touch the database.
+
+    Entries are dropped least recently used first beyond `STREAMCACHESIZE`, expire after
+    `STREAMCACHETTL` seconds, and are invalidated by `LibraryIngest` when their tracks change.
+    """
+    entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+    hits = 0
+    misses = 0
+
+
+    @classmethod
+    def get(cls, track_id: str) -> dict[str, Any] | None:
+        entry = cls.entries.get(track_id)
+
+        if entry is None or entry[0] < time.monotonic():
+            cls.entries.pop(track_id, None)
+            cls.misses += 1
+            return None
+
+        cls.entries.move_to_end(track_id)
+        cls.hits += 1
+        return entry[1]
+
+
+    @classmethod
+    def put(cls, track_id: str, descriptor: dict[str, Any]) -> None:
+        cls.entries[track_id] = (time.monotonic() + Config.STREAMCACHETTL, descriptor)
+        cls.entries.move_to_end(track_id)
+
+        while len(cls.entries) > Config.STREAMCACHESIZE:
+            cls.entries.popitem(last=False)
+
+
+    @classmethod
+    def invalidate(cls, track_ids: Iterable[str] | None = None) -> None:
+        """
+        Drops the given tracks, or every entry if no ids are given.
+        """
+        if track_ids is None:
+            cls.entries.clear()
+            return
+
+        for track_id in track_ids:
+            cls.entries.pop(track_id, None)
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from fastapi import HTTPException, status
 from typing import Any
-from core.database import NoResultFound
+from core.database import db_conn, WriteQueue, NoResultFound
 from models.user import UserModel, UserCreateModel, UserUpdateModel
 from repos.user import UserRepo
 from services.auth import AuthService
@@ -38,7 +38,8 @@ class UserService:
     async def user_login(self, email: str) -> None:
         user_id = await self.repo.get_user_id_from_email(email)
         if not user_id: raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-        await self.repo.update_user(user_id, {"last_login": datetime.now()})
+        async with db_conn(WriteQueue.INTERACTIVE) as conn:
+            await UserRepo(conn).update_user(user_id, {"last_login": datetime.now()})
 
     
     async def create_user(self, data: UserCreateModel) -> None:
@@ -56,17 +57,20 @@ class UserService:
             password=AuthService.password_encode(data.password),
         )
 
-        await self.repo.create_user(user_item.model_dump())
+        async with db_conn(WriteQueue.INTERACTIVE) as conn:
+            await UserRepo(conn).create_user(user_item.model_dump())
 
 
     async def update_user(self, user_id: str, user_data: UserUpdateModel) -> None:
         check_user = await self.repo.is_user_exist(user_id)
         if not check_user: raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-        await self.repo.update_user(user_id, user_data.model_dump(exclude_unset=True))
+        async with db_conn(WriteQueue.INTERACTIVE) as conn:
+            await UserRepo(conn).update_user(user_id, user_data.model_dump(exclude_unset=True))
 
 
     async def delete_user(self, user_id: str) -> None:
         check_user = await self.repo.is_user_exist(user_id)
         if not check_user: raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
         AuthService.delete_all_session(user_id)
-        await self.repo.delete_user(user_id)
+        async with db_conn(WriteQueue.INTERACTIVE) as conn:
+            await UserRepo(conn).delete_user(user_id)
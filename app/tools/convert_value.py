@@ -1,6 +1,9 @@
 import re
+import json
+import base64
 import hashlib
 import mimetypes
+from typing import Any
 
 
 tag_patterns = {
@@ -30,6 +33,65 @@ def hash_str(*args) -> str:
         return ''
 
 
+class InvalidCursor(ValueError):
+    """
+    Raised for a cursor `encode_cursor` didn't make, the API answers it with 400.
+    """
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Packs the sort key and id of the last row of a page into an opaque cursor.
+    """
+    data = json.dumps(values, separators=(',', ':'), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> tuple[Any, ...]:
+    """
+    Unpacks a cursor made by `encode_cursor`, raises InvalidCursor if it isn't one with `size` values.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception as error:
+        raise InvalidCursor('Invalid cursor') from error
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Invalid cursor')
+
+    # Keyset columns only hold scalars, anything else would reach SQLite as a bind parameter.
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise InvalidCursor('Invalid cursor')
+
+    return tuple(values)
+
+
+def page_after(cursor: str | None) -> tuple[Any, Any] | None:
+    """
+    Returns the (sort key, id) a listing page starts after, or None for an offset page.
+    """
+    return decode_cursor(cursor, 2) if cursor else None
+
+
+def page_cursor(rows: list[dict[str, Any]], keys: tuple[str, str], start: int, end: int) -> str | None:
+    """
+    Returns the cursor of the page after `rows`, from the `keys` of its last row.
+    """
+    # A full page may be followed by another one, which starts after its last row.
+    if not rows or len(rows) < end - (start - 1):
+        return None
+
+    return encode_cursor(*(rows[-1][key] for key in keys))
+
+
+def fts_query(query: str) -> str:
+    """
+    Turns free text into an FTS5 query that matches every word as a prefix, in any column.
+    """
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
 def safe_list(extra, key, default='') -> str:
     extra = dict(extra)
     
@@ -1,9 +1,21 @@
+import os
 import re
+import hashlib
 from pathlib import Path
 from pydantic_settings import BaseSettings
+from typing import Any
 
 ROOTDIR: Path = (Path.cwd().resolve()).parent
 
+EXCLUDED_PATTERNS: list[str] = [
+    r'.*Small.*',
+    r'.*Cache.*',
+    r'.*[{].*',
+    r'.*cache.*',
+    r'^\.',
+    r'.*~$',
+]
+
 def get_path(*args: str | Path, rel: bool = False, create_dir: bool = False) -> Path:
     """
     Abstracts a path-like object or string path and returns it as a path-like object.
@@ -23,7 +35,10 @@ def get_path(*args: str | Path, rel: bool = False, create_dir: bool = False) ->
     else:
         for arg in args: home = home / arg
     
-    return home.relative_to(ROOTDIR) if rel else home
+    if rel and home.is_relative_to(ROOTDIR):
+        return home.relative_to(ROOTDIR)
+    
+    return home
 
 
 def str_path(*args: str | Path, rel: bool = True) -> str:
@@ -38,7 +53,8 @@ def str_path(*args: str | Path, rel: bool = True) -> str:
     home = ROOTDIR
 
     for arg in args: home = home / arg
-    if rel: home = home.relative_to(ROOTDIR)
+    # Library roots on other disks are kept as absolute paths.
+    if rel and home.is_relative_to(ROOTDIR): home = home.relative_to(ROOTDIR)
 
     return home.as_posix()
 
@@ -67,25 +83,68 @@ def is_supported_file(path: str) -> bool:
         return False
 
 
+def get_fingerprint(path: str | Path, stat_result: os.stat_result | None = None) -> dict[str, Any] | None:
+    """
+    Returns the manifest fingerprint of a file, or None if the file can't be stat-ed.
+
+    Args:
+        path (str | Path): Filename.
+        stat_result (os.stat_result, optional): Reuses an existing stat instead of calling stat again.
+    """
+
+    try:
+        stat_result = stat_result or get_path(path).stat()
+    except OSError:
+        return None
+
+    return {
+        'filepath': str_path(path),
+        'filesize': stat_result.st_size,
+        'mtime_ns': stat_result.st_mtime_ns,
+        'inode': stat_result.st_ino,
+    }
+
+
+def get_partial_hash(path: str | Path, filesize: int, block_size: int = 65536) -> str:
+    """
+    Hashes the first and last `block_size` bytes of a file, which covers the tag headers
+    and trailers of common formats without reading the audio in between.
+
+    Args:
+        path (str | Path): Filename.
+        filesize (int): File size from the fingerprint.
+        block_size (int, optional): Bytes read from each end, defaults to 64 KiB.
+    """
+
+    with open(get_path(path), 'rb') as f:
+        digest = hashlib.md5(f.read(block_size))
+
+        if filesize > block_size * 2:
+            f.seek(filesize - block_size)
+            digest.update(f.read(block_size))
+        else:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
 def create_dir(Config: BaseSettings) -> None:
     Config.DATADIR.mkdir(exist_ok=True)
     Config.LIBRARYDIR.mkdir(exist_ok=True)
     Config.ARTWORKDIR.mkdir(exist_ok=True)
 
 
-def is_excluded_file(name: str) -> bool:
+def is_excluded_file(name: str, patterns: list[str] | None = None) -> bool:
     """
     Check if a file should be excluded based on its name.
+
+    Args:
+        name (str): Filename.
+        patterns (list[str], optional): Regex patterns to match, defaults to EXCLUDED_PATTERNS.
     """
 
-    patterns = [
-        r'.*Small.*',
-        r'.*Cache.*',
-        r'.*[{].*',
-        r'.*cache.*',
-        r'^\.',
-        r'.*~$',
-    ]
+    if patterns is None:
+        patterns = EXCLUDED_PATTERNS
 
     for pattern in patterns:
         if re.search(pattern, name, re.IGNORECASE):
@@ -1,7 +1,11 @@
 from datetime import datetime
+from diskcache import Cache
+from functools import lru_cache
 from tinytag import TinyTag, Image, Images
+from types import SimpleNamespace
 from typing import Any
-from tools.path_handler import get_path, str_path
+from core.config import Config
+from tools.path_handler import get_path, str_path, get_fingerprint, get_partial_hash
 from tools.convert_value import (
     hash_str,
     get_mime,
@@ -10,35 +14,112 @@ from tools.convert_value import (
     convert_artist,
 )
 
+# Bump when extract_tags derives track rows differently, so the next scan re-reads every file.
+TAG_VERSION = 1
 
-def extract_tags(path: str) -> dict[str, Any]:
-    path, real_path = str_path(path), get_path(path)
+# Bump when read_tags keeps different fields, so cached tags are read from the files again.
+RAW_VERSION = 1
+
+RAW_FIELDS = (
+    'album',
+    'albumartist',
+    'artist',
+    'bitdepth',
+    'bitrate',
+    'channels',
+    'comment',
+    'composer',
+    'disc',
+    'disc_total',
+    'duration',
+    'filesize',
+    'genre',
+    'samplerate',
+    'title',
+    'track',
+    'track_total',
+    'year',
+)
+
+
+def get_album_id(
+    album: str | None,
+    albumartist: str,
+    artist: str | None,
+    disc_total: int | None,
+    track_total: int | None,
+    directory: str,
+) -> str:
+    """
+    Albums are identified by their tags and their directory, so the id changes when an album is moved.
+    """
+    if album:
+        if disc_total:
+            return hash_str(album, albumartist, disc_total, directory)
+        else:
+            return hash_str(album, albumartist, track_total or 0, directory)
+    else:
+        return hash_str(artist, albumartist, directory)
+
+
+@lru_cache(maxsize=None)
+def get_tag_cache() -> Cache:
+    return Cache(Config.TAGCACHEDIR, size_limit=Config.TAGCACHESIZE)
+
+
+def read_tags(path: str) -> dict[str, Any]:
+    """
+    Reads the raw TinyTag fields that extract_tags builds track rows from.
+    """
+    tags = TinyTag.get(get_path(path))
+    raw_tags = {field: getattr(tags, field) for field in RAW_FIELDS}
+    raw_tags['extra'] = dict(tags.extra)
+
+    return raw_tags
+
+
+def get_raw_tags(path: str, fingerprint: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    Returns the raw tags of a file from the tag cache, reading the file on a miss.
+
+    Entries are keyed by size, mtime, inode and a partial content hash, so they outlive the
+    database: a rebuild or a new `TAG_VERSION` derives rows again without parsing the files.
+    """
+    if not Config.TAGCACHE or not fingerprint:
+        return read_tags(path)
+
+    key = ':'.join(str(value) for value in (
+        RAW_VERSION,
+        fingerprint['filesize'],
+        fingerprint['mtime_ns'],
+        fingerprint['inode'],
+        get_partial_hash(path, fingerprint['filesize']),
+    ))
+    tag_cache = get_tag_cache()
+    raw_tags = tag_cache.get(key)
+
+    if raw_tags is None:
+        raw_tags = read_tags(path)
+        tag_cache.set(key, raw_tags)
+
+    return raw_tags
+
+
+def extract_tags(path: str, fingerprint: dict[str, Any] | None = None) -> dict[str, Any]:
+    path = str_path(path)
     
     try:
-        tags = TinyTag.get(real_path)
+        tags = SimpleNamespace(**get_raw_tags(path, fingerprint))
         date, year = convert_date(tags.year)
         
-        if tags.album:
-            if tags.disc_total:
-                album_id = hash_str(
-                    tags.album,
-                    tags.albumartist or '',
-                    tags.disc_total,
-                    str_path(get_path(path).parent),
-                )
-            else:
-                album_id = hash_str(
-                    tags.album,
-                    tags.albumartist or '',
-                    tags.track_total or 0,
-                    str_path(get_path(path).parent),
-                )
-        else:
-            album_id = hash_str(
-                tags.artist,
-                tags.albumartist or '',
-                str_path(get_path(path).parent),
-            )
+        album_id = get_album_id(
+            tags.album,
+            tags.albumartist or '',
+            tags.artist,
+            tags.disc_total,
+            tags.track_total,
+            str_path(get_path(path).parent),
+        )
         
         if tags.albumartist:
             albumartist_id = hash_str(tags.albumartist.lower())
@@ -88,6 +169,37 @@ def extract_tags(path: str) -> dict[str, Any]:
         return {}
 
 
+def is_unchanged(row: Any, fingerprint: dict[str, Any]) -> bool:
+    """
+    Checks a manifest row against a fresh fingerprint and the current tag version.
+    """
+    return row.tag_version == TAG_VERSION \
+        and row.filesize == fingerprint['filesize'] \
+        and row.mtime_ns == fingerprint['mtime_ns'] \
+        and row.inode == fingerprint['inode']
+
+
+def extract_tags_batch(paths: list[str]) -> list[tuple[str, dict[str, Any], dict[str, Any] | None]]:
+    """
+    Extracts tags for a chunk of files, so a worker process handles many files per round trip.
+
+    Returns `(filepath, tags, manifest)` per file. The file is fingerprinted before its tags
+    are read, so a change during the read shows up on the next scan. The manifest is None
+    if the file is gone, and tags are empty if it couldn't be parsed.
+    """
+    results = []
+
+    for path in paths:
+        manifest = get_fingerprint(path)
+        if manifest:
+            manifest['tag_version'] = TAG_VERSION
+            results.append((manifest['filepath'], extract_tags(path, manifest), manifest))
+        else:
+            results.append((str_path(path), {}, None))
+
+    return results
+
+
 def extract_artwork(path: str) -> bytes | None:
     try:
         tag: TinyTag = TinyTag.get(get_path(path), image=True)
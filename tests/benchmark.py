@@ -0,0 +1,417 @@
+"""
+Synthetic library benchmark for the scanner.
+
+Generates a library of small but valid MP3, FLAC and OGG files with varied tags and
+folder layouts, then measures the scanner against it in a fresh process per size:
+
+    scanner             first full scan into an empty database
+    aggregate           LibraryScan.perform_all over the whole library
+    rescan              scanner again with nothing changed
+    rebuild             library_scanner after the tracks and manifest are wiped
+    tracker_add         a new folder with a tenth of the library appears
+    tracker_modify      a hundredth of the library is touched
+    tracker_move        the new folder is renamed
+    tracker_delete      the new folder is removed
+
+Every scenario reports wall time, files per second, peak RSS and SQL statement counts.
+
+    python tests/benchmark.py --sizes 1000 10000 --output before.json
+    python tests/benchmark.py --sizes 1000 10000 --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+TESTSDIR = Path(__file__).resolve().parent
+APPDIR = TESTSDIR.parent / 'app'
+
+FORMATS = ('mp3', 'flac', 'ogg')
+GENRES = ('Rock', 'Jazz', 'Electronic', 'Classical', 'Hip-Hop', 'Folk', 'Ambient', 'Pop')
+NAMES = ('Aurora', 'Basalt', 'Cinder', 'Delta', 'Ember', 'Fjord', 'Glass', 'Harbor', 'Ivory', 'Juniper')
+WORDS = ('Night', 'River', 'Signal', 'Garden', 'Static', 'Winter', 'Echo', 'Paper', 'Orbit', 'Velvet')
+UNICODE = ('Café', 'Ñandú', 'Łódź', '東京', 'Дом', 'Ωmega')
+
+SAMPLERATE = 44100
+SAMPLES = SAMPLERATE
+
+
+def syncsafe(value: int) -> bytes:
+    return bytes([(value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f])
+
+
+def write_mp3(path: Path, tags: dict[str, str]) -> None:
+    frame_ids = {
+        'title': 'TIT2',
+        'artist': 'TPE1',
+        'albumartist': 'TPE2',
+        'album': 'TALB',
+        'tracknumber': 'TRCK',
+        'discnumber': 'TPOS',
+        'date': 'TDRC',
+        'genre': 'TCON',
+    }
+    frames = b''
+
+    for key, value in tags.items():
+        if key in frame_ids:
+            data = b'\x03' + value.encode()
+            frames += frame_ids[key].encode() + syncsafe(len(data)) + b'\x00\x00' + data
+
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, 417 bytes per frame.
+    audio = (b'\xff\xfb\x90\x64' + b'\x00' * 413) * 8
+    path.write_bytes(b'ID3\x04\x00\x00' + syncsafe(len(frames)) + frames + audio)
+
+
+def vorbis_comment(tags: dict[str, str]) -> bytes:
+    vendor = b'benchmark'
+    comments = [f'{key.upper()}={value}'.encode() for key, value in tags.items()]
+
+    data = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+    for comment in comments:
+        data += struct.pack('<I', len(comment)) + comment
+
+    return data
+
+
+def write_flac(path: Path, tags: dict[str, str]) -> None:
+    stream_info = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    stream_info += struct.pack('>Q', (SAMPLERATE << 44) | (1 << 41) | (15 << 36) | SAMPLES)
+    stream_info += b'\x00' * 16
+    comment = vorbis_comment(tags)
+
+    path.write_bytes(
+        b'fLaC'
+        + bytes([0]) + len(stream_info).to_bytes(3, 'big') + stream_info
+        + bytes([0x80 | 4]) + len(comment).to_bytes(3, 'big') + comment
+    )
+
+
+def ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7 if crc & 0x80000000 else crc << 1) & 0xffffffff
+    return crc
+
+
+def ogg_page(packet: bytes, header_type: int, granule: int, sequence: int) -> bytes:
+    segments = [255] * (len(packet) // 255) + [len(packet) % 255]
+    header = b'OggS' + struct.pack('<BBqIII', 0, header_type, granule, 1, sequence, 0)
+    page = header + bytes([len(segments)]) + bytes(segments) + packet
+    return page[:22] + struct.pack('<I', ogg_crc(page)) + page[26:]
+
+
+def write_ogg(path: Path, tags: dict[str, str]) -> None:
+    identification = b'\x01vorbis' + struct.pack('<IBIiii', 0, 2, SAMPLERATE, 0, 128000, 0) + b'\xb8\x01'
+    comment = b'\x03vorbis' + vorbis_comment(tags) + b'\x01'
+    setup = b'\x05vorbis' + b'\x00' * 32
+
+    path.write_bytes(
+        ogg_page(identification, 0x02, 0, 0)
+        + ogg_page(comment, 0x00, 0, 1)
+        + ogg_page(setup, 0x04, SAMPLES, 2)
+    )
+
+
+WRITERS = {'mp3': write_mp3, 'flac': write_flac, 'ogg': write_ogg}
+
+
+def generate_library(root: Path, size: int, seed: int = 0, prefix: str = '') -> int:
+    """
+    Writes `size` files under `root` in a mix of layouts: artist/album, artist/year - album/CD n,
+    genre/artist/album, compilations with per-track artists, and loose tracks without an album.
+    """
+    rng = random.Random(seed)
+    artists = [
+        f'{rng.choice(NAMES)} {rng.choice(WORDS)}' if i % 9 else f'{rng.choice(UNICODE)} {i}'
+        for i in range(max(size // 50, 5))
+    ]
+    count, album_index = 0, 0
+
+    while count < size:
+        layout = rng.choices(('album', 'discs', 'genre', 'compilation', 'loose'), (5, 1, 2, 1, 1))[0]
+        extension = rng.choice(FORMATS)
+        artist = rng.choice(artists)
+        album = f'{prefix}{rng.choice(WORDS)} {rng.choice(WORDS)} {album_index}'
+        year = str(rng.randint(1960, 2024))
+        genre = rng.choice(GENRES)
+        track_total = min(rng.randint(6, 16), size - count)
+        disc_total = 2 if layout == 'discs' else 1
+        album_index += 1
+
+        for track in range(track_total):
+            disc = track * disc_total // track_total + 1
+            tags = {
+                'title': f'{rng.choice(WORDS)} {rng.choice(WORDS)} {count}',
+                'artist': rng.choice(artists) if layout == 'compilation' else artist,
+                'albumartist': 'Various Artists' if layout == 'compilation' else artist,
+                'album': album,
+                'tracknumber': f'{track + 1}/{track_total}',
+                'discnumber': f'{disc}/{disc_total}',
+                'date': year,
+                'genre': genre,
+            }
+
+            if layout == 'album':
+                directory = root / artist / album
+            elif layout == 'discs':
+                directory = root / artist / f'{year} - {album}' / f'CD {disc}'
+            elif layout == 'genre':
+                directory = root / genre / artist / album
+            elif layout == 'compilation':
+                directory = root / 'Compilations' / album
+            else:
+                directory = root / artist
+                for key in ('album', 'albumartist', 'discnumber'):
+                    tags.pop(key)
+
+            directory.mkdir(parents=True, exist_ok=True)
+            filename = f'{track + 1:02d} {tags["title"]}.{extension}'
+            WRITERS[extension](directory / filename, tags)
+            count += 1
+
+    return count
+
+
+def rusage_kb(who: int) -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss // 1024 if platform.system() == 'Darwin' else maxrss
+
+
+async def run_scenarios(size: int, workdir: Path) -> list[dict]:
+    sys.path.insert(0, str(APPDIR))
+
+    import models
+    from core.config import Config
+    from core.database import connect_database, disconnect_database, db_conn, engine, read_engine, text
+    from services import scanner
+    from services.library_extract import LibraryExtract
+    from services.library_scan import LibraryScan
+    from sqlalchemy import event
+    from tools.path_handler import create_dir
+
+    statements: Counter = Counter()
+    counting = True
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+        if counting:
+            statements[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    async def query(sql: str) -> int | None:
+        nonlocal counting
+        counting = False
+        try:
+            async with db_conn() as conn:
+                result = await conn.execute(text(sql))
+                return result.scalar_one() if result.returns_rows else None
+        finally:
+            counting = True
+
+    async def measure(name: str, files: int, coro) -> None:
+        statements.clear()
+        started = time.perf_counter()
+        extra = await coro or {}
+        wall = time.perf_counter() - started
+
+        results.append({
+            'scenario': name,
+            'size': size,
+            'files': files,
+            'wall': round(wall, 4),
+            'files_per_second': round(files / wall, 1) if wall else None,
+            'peak_rss_kb': rusage_kb(resource.RUSAGE_SELF),
+            'statements': dict(statements, total=sum(statements.values())),
+            **extra,
+        })
+
+    create_dir(Config)
+    await connect_database()
+    event.listen(engine.sync_engine, 'before_cursor_execute', count_statement)
+    event.listen(read_engine.sync_engine, 'before_cursor_execute', count_statement)
+    LibraryExtract.start()
+    results: list[dict] = []
+
+    await measure('scanner', size, scanner.scanner())
+    await measure('aggregate', size, LibraryScan.perform_all())
+    await measure('rescan', size, scanner.scanner())
+
+    await query('DELETE FROM tracks')
+    await query('DELETE FROM manifest')
+    await measure('rebuild', size, scanner.library_scanner())
+
+    batches: list[float] = []
+    batch_done = asyncio.Event()
+    track_changes = scanner.track_changes
+
+    async def timed_track_changes(changes) -> None:
+        started = time.perf_counter()
+        await track_changes(changes)
+        batches.append(time.perf_counter() - started)
+        batch_done.set()
+
+    async def burst(action, check: str, expected: int) -> dict:
+        batches.clear()
+        action()
+
+        while True:
+            await asyncio.wait_for(batch_done.wait(), timeout=600)
+            batch_done.clear()
+            if await query(check) == expected:
+                break
+
+        return {'batches': len(batches), 'batch_wall': round(sum(batches), 4)}
+
+    scanner.track_changes = timed_track_changes
+    watcher = asyncio.create_task(scanner.tracker())
+    await asyncio.sleep(1)
+
+    library = Config.LIBRARYDIR
+    staging = workdir / 'staging'
+    incoming = max(size // 10, 1)
+    touched = max(size // 100, 1)
+    total = await query('SELECT count(*) FROM tracks')
+    generate_library(staging, incoming, seed=1, prefix='Incoming ')
+
+    await measure('tracker_add', incoming, burst(
+        lambda: os.rename(staging, library / 'Incoming'),
+        'SELECT count(*) FROM tracks', total + incoming,
+    ))
+
+    paths = sorted(path for path in library.rglob('*') if path.is_file())[:touched]
+    stamp = time.time_ns()
+    await measure('tracker_modify', touched, burst(
+        lambda: [os.utime(path, ns=(stamp, stamp)) for path in paths],
+        f'SELECT count(*) FROM manifest WHERE mtime_ns = {stamp}', touched,
+    ))
+
+    await measure('tracker_move', incoming, burst(
+        lambda: os.rename(library / 'Incoming', library / 'Incoming Moved'),
+        "SELECT count(*) FROM tracks WHERE filepath LIKE '%/Incoming Moved/%'", incoming,
+    ))
+
+    await measure('tracker_delete', incoming, burst(
+        lambda: shutil.rmtree(library / 'Incoming Moved'),
+        'SELECT count(*) FROM tracks', total,
+    ))
+
+    watcher.cancel()
+    await asyncio.gather(watcher, return_exceptions=True)
+    LibraryExtract.shutdown()
+    await disconnect_database()
+
+    for result in results:
+        result['peak_rss_children_kb'] = rusage_kb(resource.RUSAGE_CHILDREN)
+
+    return results
+
+
+def run_size(size: int) -> list[dict]:
+    """
+    Generates a library under tests/ and benchmarks it in a child process, since the
+    app reads its configuration once at import time. The library has to live below the
+    repository root, paths are stored relative to it.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix=f'benchmark-{size}-', dir=TESTSDIR))
+    datadir = workdir / 'data'
+
+    try:
+        started = time.perf_counter()
+        generate_library(workdir / 'library', size)
+        generated = time.perf_counter() - started
+
+        env = {
+            **os.environ,
+            'DATADIR': str(datadir),
+            'LOGPATH': str(datadir / 'mixel-music.log'),
+            'ARTWORKDIR': str(datadir / 'artworks'),
+            'TAGCACHEDIR': str(datadir / 'tags'),
+            'LIBRARYDIR': str(workdir / 'library'),
+            'DBURL': f'sqlite+aiosqlite:///{datadir / "database.db"}',
+            'LOGLEVEL': '30',
+            # Aggregation is measured on its own, scheduled passes never start.
+            'AGGREGATEDELAY': '1e9',
+            'AGGREGATEMAXDELAY': '1e9',
+        }
+        for key, value in {'HOST': '127.0.0.1', 'PORT': '2843', 'ARTWORKCACHING': 'false', 'ARTWORKQUALITY': '80'}.items():
+            env.setdefault(key, value)
+
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', str(size), '--workdir', str(workdir)],
+            cwd=APPDIR,
+            env=env,
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout
+
+        results = json.loads(output.strip().splitlines()[-1])
+        for result in results:
+            result['generate_wall'] = round(generated, 4)
+        return results
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results: list[dict], baseline: list[dict]) -> None:
+    previous = {(result['scenario'], result['size']): result for result in baseline}
+    print(f'{"scenario":<16}{"size":>8}{"wall":>10}{"before":>10}{"change":>9}{"sql":>8}{"before":>8}', file=sys.stderr)
+
+    for result in results:
+        before = previous.get((result['scenario'], result['size']))
+        if before is None:
+            continue
+
+        change = (result['wall'] / before['wall'] - 1) * 100 if before['wall'] else 0.0
+        print(
+            f'{result["scenario"]:<16}{result["size"]:>8}{result["wall"]:>10.3f}{before["wall"]:>10.3f}'
+            f'{change:>+8.1f}%{result["statements"]["total"]:>8}{before["statements"]["total"]:>8}',
+            file=sys.stderr,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--output', type=Path, help='write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', type=Path, help='print the change against an earlier --output file')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_scenarios(args.child, args.workdir))))
+        return
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': [result for size in args.sizes for result in run_size(size)],
+    }
+
+    if args.compare:
+        compare(results['results'], json.loads(args.compare.read_text())['results'])
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,590 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+APPDIR = Path(__file__).resolve().parent.parent / 'app'
+DBDIR = tempfile.TemporaryDirectory()
+
+os.environ.update(
+    HOST='127.0.0.1',
+    PORT='2843',
+    ARTWORKCACHING='false',
+    ARTWORKQUALITY='80',
+    DBURL=f'sqlite+aiosqlite:///{Path(DBDIR.name) / "database.db"}',
+)
+sys.path.insert(0, str(APPDIR))
+
+import models
+from fastapi.responses import JSONResponse
+from watchfiles import Change
+from core.config import Config
+from core.database import (
+    connect_database, disconnect_database, db_conn, db_read, insert, select, update, NoResultFound, WriteQueue
+)
+from core.responses import FastJSONResponse, orjson
+from models import Album, Artist, Manifest, PlaylistData, Track
+from models.album import AlbumsResponseModel
+from models.artist import ArtistsResponseModel
+from models.scan import ScanStatusModel
+from models.search import SearchResponseModel
+from models.track import TracksResponseModel
+from repos.library import LibraryRepo
+from services.library_extract import LibraryExtract
+from services.library_ingest import LibraryIngest
+from services.library_moves import LibraryMoves
+from services.library_root import LibraryRoot
+from services.library_scan import LibraryScan
+from services.library_status import LibraryStatus
+from services.stream_cache import StreamCache
+from services.library_walk import LibraryWalk
+from services.scanner import coalesce_changes
+from tools.convert_value import InvalidCursor, encode_cursor, decode_cursor, page_cursor, hash_str
+from tools.path_handler import str_path
+from tools.tags_handler import TAG_VERSION, get_album_id
+from services.library import LibraryService
+
+
+def track_row(number: int, title: str, duration: float, **values: Any) -> dict:
+    return {
+        'album': 'Ænima',
+        'album_id': 'album-1',
+        'albumartist': 'Tool',
+        'albumartist_id': 'artist-1',
+        'artist': 'Tool',
+        'artist_id': 'artist-1',
+        'barcode': '',
+        'bitdepth': 16,
+        'bitrate': 320.0,
+        'channels': 2,
+        'comment': '',
+        'compilation': False,
+        'composer': '',
+        'content_type': 'audio/mpeg',
+        'copyright': '',
+        'date': '1996',
+        'director': '',
+        'directory': 'library/Tool/Ænima',
+        'duration': duration,
+        'disc_number': 1,
+        'disc_total': 1,
+        'filepath': f'library/Tool/Ænima/{number:02d}.mp3',
+        'filesize': 7_340_032 + number,
+        'genre': 'Metal',
+        'isrc': '',
+        'label': '',
+        'lyrics': '',
+        'samplerate': 44100,
+        'title': title,
+        'track_id': f'track-{number}',
+        'track_number': number,
+        'track_total': 3,
+        'year': '1996',
+        **values,
+    }
+
+
+class LibraryTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Starts every test from a fresh database holding one album of three tracks.
+    """
+
+    async def asyncSetUp(self) -> None:
+        await connect_database()
+
+        async with db_conn() as conn:
+            await conn.execute(insert(Track), [
+                track_row(1, 'Stinkfist', 311.2),
+                track_row(2, 'Eulogy', 508.0),
+                track_row(3, 'H. "Quoted" \\ ☃', 367.06666666666666),
+            ])
+            await conn.execute(insert(Album), [{
+                'album': 'Ænima',
+                'album_id': 'album-1',
+                'albumartist_id': 'artist-1',
+                'disc_total': 1,
+                'duration_total': 1186.2666666666667,
+                'filesize_total': 22_020_102,
+                'year': '1996',
+            }])
+            await conn.execute(insert(Artist), [{
+                'artist': 'Tool',
+                'artist_id': 'artist-1',
+                'album_total': 1,
+                'track_total': 3,
+                'duration_total': 1186.2666666666667,
+                'filesize_total': 22_020_102,
+            }])
+
+
+    async def asyncTearDown(self) -> None:
+        async with db_conn() as conn:
+            for model in (Track, Album, Artist, Manifest, PlaylistData):
+                await conn.execute(model.__table__.delete())
+
+        await disconnect_database()
+
+
+@unittest.skipIf(orjson is None, 'orjson is not installed')
+class FastJSONTest(LibraryTestCase):
+    """
+    The FASTJSON responses skip response model validation, so they must serialize to the
+    same bytes FastAPI produces after validating against the response model.
+    """
+
+
+    def assertSameJSON(self, content: dict, response_model: type) -> None:
+        validated = response_model.model_validate(content).model_dump(mode='json', by_alias=True)
+        self.assertEqual(FastJSONResponse(content).body, JSONResponse(validated).body)
+
+
+    async def test_listings(self) -> None:
+        async with db_read() as conn:
+            service = LibraryService(LibraryRepo(conn))
+
+            self.assertSameJSON(await service.get_tracks(1, 2), TracksResponseModel)
+            self.assertSameJSON(await service.get_tracks(1, 40), TracksResponseModel)
+            self.assertSameJSON(await service.get_albums(1, 40), AlbumsResponseModel)
+            self.assertSameJSON(await service.get_artists(1, 40), ArtistsResponseModel)
+
+
+    async def test_search(self) -> None:
+        async with db_read() as conn:
+            service = LibraryService(LibraryRepo(conn))
+
+            self.assertSameJSON(await service.search('tool', 20), SearchResponseModel)
+            self.assertSameJSON(await service.search('nothing', 20), SearchResponseModel)
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self) -> None:
+        self.assertEqual(decode_cursor(encode_cursor('Ænima', 'album-1'), 2), ('Ænima', 'album-1'))
+        self.assertEqual(decode_cursor(encode_cursor(None, 3.5), 2), (None, 3.5))
+
+
+    def test_invalid(self) -> None:
+        for cursor in ('', 'not a cursor', encode_cursor('a'), encode_cursor({}, 1), encode_cursor(['a'], 'b')):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, 2)
+
+
+    def test_next_page(self) -> None:
+        rows = [{'title': 'A', 'track_id': '1'}, {'title': 'B', 'track_id': '2'}]
+
+        self.assertEqual(decode_cursor(page_cursor(rows, ('title', 'track_id'), 1, 2), 2), ('B', '2'))
+        self.assertIsNone(page_cursor(rows, ('title', 'track_id'), 1, 3))
+        self.assertIsNone(page_cursor([], ('title', 'track_id'), 1, 0))
+
+
+class AlbumScanTest(LibraryTestCase):
+
+    async def test_albumartist_matches_its_id(self) -> None:
+        # The larger id belongs to the smaller name, separate aggregates would mix them up.
+        async with db_conn() as conn:
+            await conn.execute(insert(Track), [
+                track_row(4, 'Parabol', 184.0, album_id='album-2', track_id='track-4'),
+                track_row(5, 'Judith', 243.0, album_id='album-2', track_id='track-5',
+                          albumartist='A Perfect Circle', albumartist_id='artist-2'),
+            ])
+
+        await LibraryScan.perform_albums({'album-2'})
+
+        async with db_read() as conn:
+            album = (await conn.execute(
+                select(Album.albumartist, Album.albumartist_id, Album.track_total).where(Album.album_id == 'album-2')
+            )).mappings().one()
+
+        self.assertEqual(dict(album), {'albumartist': 'A Perfect Circle', 'albumartist_id': 'artist-2', 'track_total': 2})
+
+
+    async def test_untitled_albums_not_listed(self) -> None:
+        async with db_conn() as conn:
+            await conn.execute(insert(Track), [
+                track_row(4, 'Demo', 60.0, album='', album_id='album-2', track_id='track-4'),
+            ])
+
+        await LibraryScan.perform_albums({'album-2'})
+
+        async with db_read() as conn:
+            albums, _ = await LibraryRepo(conn).get_albums(1, 40)
+
+        self.assertEqual([album['album_id'] for album in albums], ['album-1'])
+
+
+class CounterTest(LibraryTestCase):
+
+    async def test_totals_follow_writes(self) -> None:
+        async with db_conn() as conn:
+            repo = LibraryRepo(conn)
+            # An upsert that updates an existing track doesn't count it twice.
+            await repo.upsert_tracks([track_row(1, 'Stinkfist', 311.2), track_row(4, 'Pushit', 836.0)])
+            self.assertEqual(await repo.get_total('tracks'), 4)
+
+            await repo.delete_tracks([track_row(1, '', 0.0)['filepath'], track_row(2, '', 0.0)['filepath']])
+            self.assertEqual(await repo.get_total('tracks'), 2)
+            self.assertEqual(await repo.get_total('albums'), 1)
+            self.assertEqual(await repo.get_total('artists'), 1)
+
+        ingest = LibraryIngest(batch_size=100)
+        await ingest.move(track_row(3, '', 0.0)['filepath'], manifest_row('library/Tool/Live/03.mp3', 7))
+        await ingest.flush()
+        await LibraryScan.perform_all()
+
+        async with db_read() as conn:
+            self.assertEqual(await LibraryRepo(conn).get_total('tracks'), 2)
+            self.assertEqual(await LibraryRepo(conn).get_total('albums'), 2)
+
+
+class ArtistTest(LibraryTestCase):
+
+    async def test_albums_through_relation(self) -> None:
+        async with db_conn() as conn:
+            await conn.execute(insert(Track), [
+                track_row(4, 'Opiate', 320.0, album='Opiate', album_id='album-2', track_id='track-4', year='1992'),
+                track_row(5, 'Guest', 200.0, album='Opiate', album_id='album-2', track_id='track-5', year='1992',
+                          artist='Guest', artist_id='artist-2'),
+            ])
+
+        await LibraryScan.perform_albums({'album-1', 'album-2'})
+
+        async with db_read() as conn:
+            repo = LibraryRepo(conn)
+            artist = await repo.get_artist('artist-1')
+            guest = await repo.get_artist('artist-2')
+
+            with self.assertRaises(NoResultFound):
+                await repo.get_artist('artist-3')
+
+        self.assertEqual([album['album_id'] for album in artist['albums']], ['album-2', 'album-1'])
+        self.assertEqual(artist['artist'], 'Tool')
+        # A track artist gets the albums they appear on.
+        self.assertEqual([album['album_id'] for album in guest['albums']], ['album-2'])
+        self.assertEqual(guest['artist_id'], 'artist-2')
+
+
+class ItemPathTest(LibraryTestCase):
+
+    async def test_album_without_artwork_path(self) -> None:
+        async with db_read() as conn:
+            data = await LibraryRepo(conn).get_item_path('album-1')
+
+        self.assertTrue(data['filepath'].startswith('library/Tool/Ænima/'))
+
+
+    async def test_album_artwork_path_first(self) -> None:
+        async with db_conn() as conn:
+            await conn.execute(update(Album).values(artwork_path='library/Tool/Ænima/03.mp3'))
+
+        async with db_read() as conn:
+            data = await LibraryRepo(conn).get_item_path('album-1')
+
+        self.assertEqual(data, {'filepath': 'library/Tool/Ænima/03.mp3'})
+
+
+class SearchTest(LibraryTestCase):
+
+    async def test_best_match_ranks_first(self) -> None:
+        # Weak genre matches fill the index ahead of the title match, which gets the highest rowid.
+        async with db_conn() as conn:
+            await conn.execute(insert(Track), [
+                track_row(number, f'Song {number}', 60.0, genre='Love', track_id=f'genre-{number}')
+                for number in range(10, 6010)
+            ])
+            await conn.execute(insert(Track), [track_row(6010, 'Love', 60.0, track_id='title')])
+
+        async with db_read() as conn:
+            results = await LibraryService(LibraryRepo(conn)).search('love', 5)
+
+        self.assertEqual(results['tracks'][0]['track_id'], 'title')
+
+
+def manifest_row(filepath: str, inode: int, filesize: int = 1000, mtime_ns: int = 1) -> dict:
+    return {
+        'filepath': filepath,
+        'filesize': filesize,
+        'mtime_ns': mtime_ns,
+        'inode': inode,
+        'tag_version': TAG_VERSION,
+    }
+
+
+class LibraryMovesTest(unittest.TestCase):
+
+    def test_inode_match(self) -> None:
+        moves = LibraryMoves([SimpleNamespace(**manifest_row('old.mp3', 7))])
+
+        self.assertEqual(moves.match(manifest_row('new.mp3', 7)), 'old.mp3')
+        # A removed file is only matched once.
+        self.assertIsNone(moves.match(manifest_row('copy.mp3', 7)))
+
+
+    def test_size_and_mtime_match(self) -> None:
+        moves = LibraryMoves([
+            SimpleNamespace(**manifest_row('a.mp3', 1)),
+            SimpleNamespace(**manifest_row('b.mp3', 2, filesize=2000)),
+        ])
+
+        self.assertEqual(moves.match(manifest_row('other-disk/b.mp3', 9, filesize=2000)), 'b.mp3')
+        self.assertIsNone(moves.match(manifest_row('other-disk/c.mp3', 9, filesize=3000)))
+
+
+    def test_ambiguous_size_and_mtime(self) -> None:
+        moves = LibraryMoves([
+            SimpleNamespace(**manifest_row('a.mp3', 1)),
+            SimpleNamespace(**manifest_row('b.mp3', 2)),
+        ])
+
+        self.assertIsNone(moves.match(manifest_row('other-disk/a.mp3', 9)))
+        self.assertEqual(moves.match(manifest_row('b2.mp3', 2)), 'b.mp3')
+
+
+    def test_unusable_rows_ignored(self) -> None:
+        moves = LibraryMoves([
+            SimpleNamespace(**manifest_row('a.mp3', 0)),
+            SimpleNamespace(**{**manifest_row('b.mp3', 2, filesize=2000), 'tag_version': TAG_VERSION - 1}),
+        ])
+
+        self.assertIsNone(moves.match(manifest_row('a2.mp3', 0)))
+        self.assertIsNone(moves.match(manifest_row('b2.mp3', 2, filesize=2000)))
+
+
+class IngestTest(LibraryTestCase):
+
+    async def test_move_keeps_playlist_entry(self) -> None:
+        async with db_conn() as conn:
+            await conn.execute(insert(PlaylistData), [{'playlist_id': 'playlist-1', 'track_id': 'track-1'}])
+
+        ingest = LibraryIngest(batch_size=100)
+        await ingest.move(track_row(1, 'Stinkfist', 311.2)['filepath'], manifest_row('library/Tool/Live/01.mp3', 7))
+        await ingest.flush()
+
+        track_id = hash_str('library/Tool/Live/01.mp3')
+        async with db_read() as conn:
+            track = (await conn.execute(
+                select(Track.title, Track.album_id, Track.directory).where(Track.track_id == track_id)
+            )).mappings().one()
+            playlist_track_ids = (await conn.execute(select(PlaylistData.track_id))).scalars().all()
+
+        # The album id is the one a fresh scan of the new directory would give it.
+        self.assertEqual(dict(track), {
+            'title': 'Stinkfist',
+            'album_id': get_album_id('Ænima', 'Tool', 'Tool', 1, 3, 'library/Tool/Live'),
+            'directory': 'library/Tool/Live',
+        })
+        self.assertEqual(playlist_track_ids, [track_id])
+
+
+    async def test_move_onto_existing_file(self) -> None:
+        replaced = track_row(3, '', 0.0)['filepath']
+        ingest = LibraryIngest(batch_size=100)
+        await ingest.move(track_row(2, 'Eulogy', 508.0)['filepath'], manifest_row(replaced, 7))
+        await ingest.flush()
+
+        async with db_read() as conn:
+            tracks = (await conn.execute(select(Track.title, Track.filepath).order_by(Track.filepath))).all()
+            filepaths = (await conn.execute(select(Manifest.filepath))).scalars().all()
+
+        self.assertEqual([tuple(track) for track in tracks], [
+            ('Stinkfist', track_row(1, '', 0.0)['filepath']),
+            ('Eulogy', replaced),
+        ])
+        self.assertEqual(filepaths, [replaced])
+
+
+    async def test_flush_invalidates_stream_cache(self) -> None:
+        tags = track_row(1, 'Stinkfist (Remaster)', 311.2)
+        StreamCache.put(hash_str(tags['filepath']), {'path': tags['filepath']})
+        StreamCache.put('unrelated', {'path': 'library/other.mp3'})
+
+        ingest = LibraryIngest(batch_size=100)
+        await ingest.put(tags['filepath'], tags, manifest_row(tags['filepath'], 7))
+        await ingest.flush()
+
+        self.assertIsNone(StreamCache.get(hash_str(tags['filepath'])))
+        self.assertIsNotNone(StreamCache.get('unrelated'))
+        StreamCache.invalidate()
+
+
+    async def test_failed_flush_is_retried(self) -> None:
+        ingest = LibraryIngest(batch_size=100)
+        tags = track_row(4, 'Pushit', 836.0)
+        await ingest.put(tags['filepath'], tags, {
+            'filepath': tags['filepath'],
+            'filesize': tags['filesize'],
+            'mtime_ns': 1,
+            'inode': 1,
+            'tag_version': 1,
+        })
+        await ingest.remove(track_row(1, 'Stinkfist', 311.2)['filepath'])
+
+        with mock.patch('services.library_ingest.db_conn', side_effect=TimeoutError):
+            with self.assertRaises(TimeoutError):
+                await ingest.flush()
+
+        self.assertEqual(ingest.pending, 2)
+        await ingest.flush()
+
+        async with db_read() as conn:
+            track_ids = (await conn.execute(select(Track.track_id).order_by(Track.track_id))).scalars().all()
+            filepaths = (await conn.execute(select(Manifest.filepath))).scalars().all()
+
+        self.assertEqual(track_ids, ['track-2', 'track-3', 'track-4'])
+        self.assertEqual(filepaths, [tags['filepath']])
+
+
+class StatusTest(unittest.TestCase):
+
+    def test_aggregation(self) -> None:
+        with mock.patch.multiple(LibraryScan, coalesced=3, last_duration=0.5):
+            status = ScanStatusModel.model_validate(LibraryStatus.stats())
+
+        self.assertEqual(status.aggregation.coalesced, 3)
+        self.assertEqual(status.aggregation.last_duration, 0.5)
+
+
+    def test_extract(self) -> None:
+        with mock.patch.multiple(LibraryExtract, processed=90, failed=2, busy_time=3.0):
+            status = ScanStatusModel.model_validate(LibraryStatus.stats())
+
+        self.assertEqual((status.extract.processed, status.extract.failed), (90, 2))
+        self.assertEqual(status.extract.throughput, 30.0)
+
+
+class LibraryRootTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+
+    async def test_empty_root_is_online(self) -> None:
+        root = LibraryRoot(Path(self.directory.name))
+        self.assertTrue(await root.check())
+
+        shutil.rmtree(self.directory.name)
+        self.assertFalse(await root.check())
+
+
+    async def test_unmounted_root_is_offline(self) -> None:
+        root = LibraryRoot(Path(self.directory.name))
+        (Path(self.directory.name) / 'Album').mkdir()
+
+        with mock.patch('os.path.ismount', return_value=True):
+            self.assertTrue(await root.check())
+
+        (Path(self.directory.name) / 'Album').rmdir()
+        self.assertFalse(await root.check())
+        self.assertEqual(root.error, 'Library disk is unmounted')
+
+
+    async def test_hidden_root_is_watched(self) -> None:
+        path = Path(self.directory.name) / '.music'
+        (path / '.hidden').mkdir(parents=True)
+        (path / 'song.mp3').touch()
+        (path / '.hidden' / 'song.mp3').touch()
+
+        with mock.patch.object(LibraryRoot, 'roots', [LibraryRoot(path)]):
+            net_changes = await coalesce_changes({
+                (Change.added, str(path / 'song.mp3')),
+                (Change.added, str(path / '.hidden' / 'song.mp3')),
+            })
+
+        self.assertEqual(list(net_changes), [(path / 'song.mp3').as_posix()])
+
+
+    async def test_walk_skips_known_files(self) -> None:
+        path = Path(self.directory.name)
+        (path / 'Album').mkdir()
+        for name in ('01.mp3', '02.mp3'):
+            (path / 'Album' / name).touch()
+
+        walk = LibraryWalk(path, known={str_path(path / 'Album' / '01.mp3')})
+        files = [file async for file, _ in walk.walk()]
+
+        self.assertEqual(files, [str_path(path / 'Album' / '02.mp3')])
+        self.assertEqual(walk.skipped, 1)
+
+
+class WriteQueueTest(LibraryTestCase):
+
+    async def job(self, events: list[str], name: str, priority: int, duration: float = 0.0) -> None:
+        async with db_conn(priority) as conn:
+            events.append(f'{name} start')
+            await conn.execute(insert(Track), [track_row(10 + len(events), name, 1.0, track_id=name)])
+            await asyncio.sleep(duration)
+        events.append(f'{name} done')
+
+
+    async def test_interactive_goes_first_and_commits_alone(self) -> None:
+        events = []
+        first = asyncio.create_task(self.job(events, 'bulk-1', WriteQueue.BULK, 0.1))
+        await asyncio.sleep(0.01)
+        queued = [
+            asyncio.create_task(self.job(events, f'bulk-{number}', WriteQueue.BULK, 0.1))
+            for number in (2, 3)
+        ]
+        await asyncio.sleep(0.01)
+        await self.job(events, 'interactive', WriteQueue.INTERACTIVE)
+
+        # It ran ahead of the queued bulk jobs and didn't wait for them to commit.
+        self.assertEqual(events[:2], ['bulk-1 start', 'interactive start'])
+        self.assertNotIn('bulk-2 start', events)
+        await asyncio.gather(first, *queued)
+        self.assertEqual(len(events), 8)
+
+        async with db_read() as conn:
+            track_ids = (await conn.execute(select(Track.track_id).where(Track.track_id.in_(
+                ['bulk-1', 'bulk-2', 'bulk-3', 'interactive']
+            )))).scalars().all()
+
+        self.assertEqual(len(track_ids), 4)
+
+
+    async def test_failed_job_rolls_back_alone(self) -> None:
+        async def failing() -> None:
+            async with db_conn() as conn:
+                await conn.execute(insert(Track), [track_row(20, 'Failed', 1.0, track_id='failed')])
+                raise RuntimeError
+
+        events = []
+        first = asyncio.create_task(self.job(events, 'kept-1', WriteQueue.BULK, 0.05))
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(
+            failing(), self.job(events, 'kept-2', WriteQueue.BULK), first, return_exceptions=True,
+        )
+
+        self.assertIsInstance(results[0], RuntimeError)
+        async with db_read() as conn:
+            track_ids = (await conn.execute(select(Track.track_id).where(Track.track_id.in_(
+                ['kept-1', 'kept-2', 'failed']
+            )))).scalars().all()
+
+        self.assertEqual(sorted(track_ids), ['kept-1', 'kept-2'])
+        self.assertGreater(WriteQueue.stats()['jobs'], 0)
+
+
+    async def test_acquire_times_out(self) -> None:
+        events = []
+        first = asyncio.create_task(self.job(events, 'slow', WriteQueue.BULK, 0.2))
+        await asyncio.sleep(0.01)
+
+        with mock.patch.object(Config, 'DBTIMEOUT', 0.05):
+            with self.assertRaises(TimeoutError):
+                await self.job(events, 'late', WriteQueue.INTERACTIVE)
+
+        await first
+        # The writer is free again once the slow job is done.
+        await self.job(events, 'next', WriteQueue.INTERACTIVE)
+        self.assertEqual(events, ['slow start', 'slow done', 'next start', 'next done'])
+        self.assertFalse(WriteQueue.busy)
+
+
+if __name__ == '__main__':
+    unittest.main()